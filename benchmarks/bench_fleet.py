@@ -0,0 +1,237 @@
+#! /usr/bin/env python
+"""Fleet-scale planning benchmark.
+
+Builds a synthetic fleet of N hosts running qcluster-style workloads
+(one grandpa VM plus a few node VMs per cluster), plans placements
+with the solver, then injects host failures and additions and plans
+again.  Each SCENARIO is run at each size:
+
+    half   VMs fill about half the fleet's cpu, all nodes the same
+           size.  Best fit's first choice nearly always works
+    tight  VMs fill 95% of the cpu, nodes of mixed sizes, and the VMs
+           of a cluster must be on distinct hosts, so the solver has
+           to back out of choices
+
+Reports:
+
+    plan      initial plan latency
+    replan    latency to re-place only the VMs on failed hosts
+    full      latency to plan the whole fleet again from scratch
+    branches  solver evaluations (branches) for the initial plan
+    prunes    pruned branches for the initial plan
+    unplaced  VMs the initial plan found no room for
+    peak      peak memory allocated while planning, measured in a
+              separate run since tracing slows planning down
+
+The model mirrors the host and reserve predicates in
+predicates/provisioning.py using Ledger, CapacityIndex and
+DependencyIndex directly, since the predicate Env can't run a plan end to end yet.
+
+Each cluster is placed by its own solve, as each qcluster predicate
+would be, and each placement offers the solver only the CHOICES best
+hosts.  The solver queues every sibling of a choice as a copy of the
+path so far, and retries the shallowest sibling first, so one solve
+for the whole fleet would cost O(N^3), and far more once it has to
+back out of a choice deep in the plan.
+
+    python -m benchmarks.bench_fleet [N ...]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from solver import Solver
+from predicates.capacity import CapacityIndex
+from predicates.depindex import DependencyIndex
+from predicates.ledger import Ledger
+
+GRANDPA = dict(cpu=2, ram=4, disk=20)
+NODE = dict(cpu=4, ram=16, disk=120)
+NODE_SIZES = (dict(cpu=2, ram=8, disk=60), NODE, dict(cpu=8, ram=32, disk=240))
+NODES_PER_CLUSTER = 3
+CHOICES = 8
+
+SCENARIOS = (
+    ("half", dict(fill=0.5)),
+    ("tight", dict(fill=0.95, mixed=True, anti_affinity=True)),
+)
+
+
+class Fleet(object):
+    def __init__(self, nhosts, seed=1, order="best_fit", choices=CHOICES,
+                 fill=0.5, mixed=False, anti_affinity=False):
+        """fill is the fraction of the fleet's cpu the VMs need.  With
+        mixed, node sizes vary.  With anti_affinity, no two VMs of a
+        cluster may share a host"""
+        self.rnd = random.Random(seed)
+        self.order = order
+        self.choices = choices
+        self.anti_affinity = anti_affinity
+        self.index = CapacityIndex()
+        self.ledger = Ledger(index=self.index)
+        self.deps = DependencyIndex()
+        self.solver = Solver()
+        self.placements = {} # map from vm name -> host name
+        self.vms = {} # map from vm name -> resources it needs
+        self.clusters = {} # map from cluster name -> its vm names
+        self.hosts = {} # map from host name -> (tags, capacity)
+        self.failed = [] # names of failed hosts
+        self.branches = 0
+        self.prunes = 0
+        self.unplaced = 0
+        self.nhosts = 0
+        for i in range(nhosts):
+            self.host_add()
+
+        cpu = sum(capacity["cpu"] for tags, capacity in self.hosts.values())
+        used = 0
+        while True:
+            nodes = [self.rnd.choice(NODE_SIZES) if mixed else NODE
+                     for j in range(NODES_PER_CLUSTER)]
+            need = GRANDPA["cpu"] + sum(node["cpu"] for node in nodes)
+            if used + need > cpu * fill:
+                break
+            used += need
+            cluster = "qcluster%d" % len(self.clusters)
+            self.vms[cluster + "-grandpa"] = GRANDPA
+            for j, node in enumerate(nodes):
+                self.vms["%s-node%d" % (cluster, j)] = node
+            self.clusters[cluster] = [cluster + "-grandpa"] + [
+                "%s-node%d" % (cluster, j) for j in range(len(nodes))]
+
+    def host_add(self, tags=None, **capacity):
+        """add a host, random unless tags and capacity are given"""
+        name = "host%d" % self.nhosts
+        self.nhosts += 1
+        if tags is None:
+            tags = self.rnd.sample(["ssd", "gpu", "10g"], 1)
+            capacity = dict(cpu=self.rnd.choice([16, 32]),
+                            ram=self.rnd.choice([64, 128, 256]),
+                            disk=self.rnd.choice([1000, 2000]))
+        self.hosts[name] = (tags, capacity)
+        self.ledger.add(name, tags=tags, **capacity)
+        return name
+
+    def host_fail(self, host=None):
+        """remove host, or a random host that has VMs, and return the
+        VMs it had"""
+        if host is None:
+            host = self.placements[self.rnd.choice(sorted(self.placements))]
+        self.ledger.remove(host)
+        self.failed.append(host)
+        lost = self.deps.dependents(("hosts", host))
+        for vm in lost:
+            self.deps.discard(vm)
+            del self.placements[vm]
+        return lost
+
+    def place(self, solver, cluster, vms):
+        """the body of the host and reserve predicates for each vm of
+        cluster"""
+        self.branches += 1
+        mark = self.ledger.mark()
+        try:
+            placements = {}
+            used = set()
+            if self.anti_affinity:
+                used.update(self.placements[vm] for vm in self.clusters[cluster]
+                            if vm in self.placements)
+            for vm in vms:
+                need = self.vms[vm]
+                hosts = self.index.candidates(order=self.order,
+                                              limit=self.choices, **need)
+                if not hosts:
+                    self.prunes += 1
+                    solver.prune()
+                host = solver.choose(hosts)
+                if host in used:
+                    self.prunes += 1
+                    solver.prune()
+                if self.anti_affinity:
+                    used.add(host)
+                self.ledger.reserve(host, **need)
+                placements[vm] = host
+            return placements
+        finally:
+            # each branch starts from the same capacity
+            self.ledger.rollback(mark)
+
+    def plan(self, vms):
+        """place vms a cluster at a time, committing the first
+        solution found for each.  Returns the placements made"""
+        by_cluster = {}
+        for vm in vms:
+            by_cluster.setdefault(vm.rsplit("-", 1)[0], []).append(vm)
+        placed = {}
+        for cluster in sorted(by_cluster):
+            for placements in self.solver.solve(self.place, cluster,
+                                                sorted(by_cluster[cluster])):
+                break
+            else:
+                self.unplaced += len(by_cluster[cluster])
+                continue
+            for vm, host in placements.items():
+                self.ledger.reserve(host, **self.vms[vm])
+                self.placements[vm] = host
+                self.deps.add(vm, ("hosts", host))
+            placed.update(placements)
+        self.ledger.commit()
+        return placed
+
+
+def timed(fn, *args):
+    t = time.time()
+    ret = fn(*args)
+    return ret, time.time() - t
+
+
+def bench(nhosts, scenario, failures=3, additions=3):
+    name, options = scenario
+    fleet = Fleet(nhosts, **options)
+    vms = list(fleet.vms)
+    placements, plan_t = timed(fleet.plan, vms)
+    branches, prunes, unplaced = fleet.branches, fleet.prunes, fleet.unplaced
+
+    # build the fleet first, so peak counts only planning
+    traced = Fleet(nhosts, **options)
+    tracemalloc.start()
+    traced.plan(vms)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del traced
+
+    # lose some hosts, gain some, and re-place only the lost vms
+    lost = set()
+    for i in range(failures):
+        lost |= fleet.host_fail()
+    added = [fleet.host_add() for i in range(additions)]
+    placements, replan_t = timed(fleet.plan, lost)
+
+    # versus planning everything again on the same changed fleet
+    full = Fleet(nhosts, **options)
+    for host in fleet.failed:
+        full.host_fail(host)
+    for host in added:
+        tags, capacity = fleet.hosts[host]
+        full.host_add(tags, **capacity)
+    placements, full_t = timed(full.plan, vms)
+
+    print("%-5s %7d hosts %7d vms  plan %8.3fs  replan %8.3fs (%4d vms)  full %8.3fs"
+          "  branches %6d  prunes %6d  unplaced %5d  peak %8.1f MB" % (
+              name, nhosts, len(vms), plan_t, replan_t, len(lost), full_t,
+              branches, prunes, unplaced, peak / 1e6))
+
+
+def main(sizes):
+    for n in sizes:
+        for scenario in SCENARIOS:
+            bench(n, scenario)
+
+
+if __name__ == '__main__':
+    sizes = [100, 300, 1000]
+    if len(sys.argv) > 1:
+        sizes = [int(n) for n in sys.argv[1:]]
+    main(sizes)
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+"""Microbenchmark for VarPath attribute access in a hot loop.
+
+Compares cached child handles against creating a fresh handle on
+every access, which is what VarPath did before it cached children.
+
+    python -m benchmarks.bench_varpath [loops]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from predicates import varstore
+
+
+class UncachedVarPath(varstore.VarPath):
+    __slots__ = ()
+
+    def child(self, name):
+        return UncachedVarPath(self.keystore, self.path + (name,))
+
+
+def access(r, loops):
+    total = 0
+    for i in range(loops):
+        total += r.d1.d2.v1.get()
+    return total
+
+
+def handles(r, loops):
+    return [r.d1.d2.v1 for i in range(loops)]
+
+
+def bench(name, r, loops):
+    access(r, 1)
+    t = time.time()
+    access(r, loops)
+    elapsed = time.time() - t
+
+    # keep every handle alive so each allocation shows up in the trace
+    tracemalloc.start()
+    kept = handles(r, loops)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    print("%-10s %8.1f ns/access  %6.1f bytes/access" % (
+        name, elapsed / loops * 1e9, float(current) / loops))
+
+
+def main(loops=100000):
+    store = varstore.VarStore()
+    r = store.top()
+    r.d1.d2.v1 = 1
+    bench("cached", r, loops)
+    bench("uncached", UncachedVarPath(store), loops)
+
+
+if __name__ == '__main__':
+    loops = 100000
+    if len(sys.argv) > 1:
+        loops = int(sys.argv[1])
+    main(loops)
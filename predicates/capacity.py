@@ -0,0 +1,216 @@
+#! /usr/bin/env python
+import bisect
+
+RESOURCES = ("cpu", "ram", "disk")
+
+
+class CapacityIndex(object):
+    """Free capacity of the available hosts, indexed for placement.
+
+    Hosts are bucketed by tag, plus one bucket of all hosts.  Each
+    bucket keeps its hosts sorted by every resource.  candidates()
+    bisects each sorted list to count the hosts with enough of that
+    resource, then scans only the shortest of those runs.
+
+        index = CapacityIndex()
+        index.add("h1", tags=("ssd",), cpu=8, ram=64, disk=1000)
+        index.candidates("ssd", cpu=2, ram=16)  # ["h1"]
+        index.adjust("h1", cpu=-2, ram=-16)
+
+    candidates(order=...) returns hosts in the order a value-ordering
+    policy prefers, so a solver choosing among them tries the most
+    promising hosts first.  See ORDERINGS.  best_fit and worst_fit
+    (or spread) by name are read straight off the sorted run of the
+    scarcest resource, so candidates(order="best_fit", limit=k) stops
+    after k hosts instead of collecting and sorting every one.
+
+    If on_read is set, it's called before every read of free amounts,
+    so an owner like Ledger can bring the index up to date only when
+    it's about to be used.
+    """
+
+    ALL = None # the bucket of all hosts
+
+    def __init__(self, resources=RESOURCES):
+        self.resources = tuple(resources)
+        self.free = {} # map from host name -> list of free amounts
+        self.tags = {} # map from host name -> frozenset of tags
+        self.buckets = {} # map from tag -> list of sorted [(free, name)]
+        self.on_read = None # called before reads, e.g. Ledger.sync
+
+    def add(self, name, tags=(), **amounts):
+        """index host name.  Unspecified resources are 0"""
+        if name in self.free:
+            self.remove(name)
+        free = [amounts.pop(r, 0) for r in self.resources]
+        assert not amounts, "unknown resources: %s" % sorted(amounts)
+        tags = frozenset(tags)
+        self.free[name] = free
+        self.tags[name] = tags
+        for tag in (self.ALL,) + tuple(tags):
+            bucket = self.buckets.get(tag)
+            if bucket is None:
+                bucket = self.buckets[tag] = [[] for r in self.resources]
+            for i, amount in enumerate(free):
+                bisect.insort(bucket[i], (amount, name))
+
+    def remove(self, name):
+        """stop offering host name, e.g. when it becomes unavailable"""
+        free = self.free.pop(name)
+        tags = self.tags.pop(name)
+        for tag in (self.ALL,) + tuple(tags):
+            bucket = self.buckets[tag]
+            for i, amount in enumerate(free):
+                self._delete(bucket[i], amount, name)
+            if not bucket[0]:
+                del self.buckets[tag]
+
+    def adjust(self, name, **deltas):
+        """add deltas to host name's free resources"""
+        self.set(name, **dict((r, self.get(name, r) + delta)
+                              for r, delta in deltas.items()))
+
+    def set(self, name, **amounts):
+        """set host name's free resources"""
+        free = self.free[name]
+        buckets = [self.buckets[tag]
+                   for tag in (self.ALL,) + tuple(self.tags[name])]
+        for r, amount in amounts.items():
+            i = self.resources.index(r)
+            old = free[i]
+            if old == amount:
+                continue
+            for bucket in buckets:
+                self._delete(bucket[i], old, name)
+                bisect.insort(bucket[i], (amount, name))
+            free[i] = amount
+
+    def get(self, name, resource):
+        if self.on_read is not None:
+            self.on_read()
+        return self.free[name][self.resources.index(resource)]
+
+    def candidates(self, tags=None, order=None, limit=None, **need):
+        """return the names of hosts with at least need of every
+        resource and all of tags.  tags is a tag or a list of tags.
+        order is a name in ORDERINGS or a function like best_fit.
+        limit, if given, returns only the first limit hosts"""
+        if self.on_read is not None:
+            self.on_read()
+        if tags is None:
+            tags = ()
+        elif isinstance(tags, str):
+            tags = (tags,)
+        tags = frozenset(tags)
+
+        # start from the smallest bucket that has every tag
+        bucket = None
+        for tag in tags or (self.ALL,):
+            b = self.buckets.get(tag)
+            if b is None:
+                return []
+            if bucket is None or len(b[0]) < len(bucket[0]):
+                bucket = b
+
+        # then scan only the hosts with enough of the scarcest resource
+        amounts = [need.pop(r, 0) for r in self.resources]
+        assert not need, "unknown resources: %s" % sorted(need)
+        best = None
+        for i, amount in enumerate(amounts):
+            start = bisect.bisect_left(bucket[i], (amount,))
+            if best is None or len(bucket[i]) - start < best[2]:
+                best = (i, start, len(bucket[i]) - start)
+        i, start, count = best
+
+        run = bucket[i]
+        step = SCANS.get(order) if not callable(order) else None
+        if step is None:
+            positions = range(start, len(run))
+        else:
+            # the run is sorted by free amount of the scarcest resource,
+            # which is best or worst fit order on that resource already
+            positions = range(start, len(run)) if step > 0 \
+                else range(len(run) - 1, start - 1, -1)
+        stop = limit if step is not None or order is None else None
+
+        hosts = []
+        for p in positions:
+            name = run[p][1]
+            free = self.free[name]
+            for j, amount in enumerate(amounts):
+                if free[j] < amount:
+                    break
+            else:
+                if tags <= self.tags[name]:
+                    hosts.append(name)
+                    if stop is not None and len(hosts) >= stop:
+                        break
+
+        if order is not None and step is None:
+            if not callable(order):
+                order = ORDERINGS[order]
+            hosts = order(self, hosts, amounts)
+        if limit is not None:
+            del hosts[limit:]
+        return hosts
+
+    def leftover(self, name, amounts):
+        """return the fraction of each resource host name would have
+        left after taking amounts, relative to the largest free amount
+        of that resource on any host"""
+        if self.on_read is not None:
+            self.on_read()
+        free = self.free[name]
+        hosts = self.buckets[self.ALL]
+        return [float(free[i] - amount) / (hosts[i][-1][0] or 1)
+                for i, amount in enumerate(amounts)]
+
+    @staticmethod
+    def _delete(lst, amount, name):
+        i = bisect.bisect_left(lst, (amount, name))
+        assert lst[i] == (amount, name)
+        del lst[i]
+
+    def __contains__(self, name):
+        return name in self.free
+
+    def __len__(self):
+        return len(self.free)
+
+
+# value-ordering policies for CapacityIndex.candidates().  Each takes
+# the index, a list of host names, and the list of amounts needed per
+# resource, and returns the hosts in the order to try them.  These
+# weigh every resource.  Passed by name, best_fit and worst_fit use
+# SCANS instead, which order by the scarcest resource only.
+
+def best_fit(index, hosts, amounts):
+    """least capacity left over first, to pack hosts tightly"""
+    return sorted(hosts, key=lambda name: sum(index.leftover(name, amounts)))
+
+
+def worst_fit(index, hosts, amounts):
+    """most capacity left over first, to spread load across hosts"""
+    return sorted(hosts, key=lambda name: -sum(index.leftover(name, amounts)))
+
+
+def fail_first(index, hosts, amounts):
+    """tightest single resource first, so a host that is about to run
+    out of something is used, or ruled out, early"""
+    return sorted(hosts, key=lambda name: min(index.leftover(name, amounts)))
+
+
+# orderings candidates() reads off its sorted runs: 1 for least free
+# first, -1 for most free first
+SCANS = {
+    "best_fit": 1,
+    "worst_fit": -1,
+    "spread": -1,
+}
+
+ORDERINGS = {
+    "best_fit": best_fit,
+    "worst_fit": worst_fit,
+    "spread": worst_fit,
+    "fail_first": fail_first,
+}
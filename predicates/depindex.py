@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+
+
+class DependencyIndex(object):
+    """Maps variable paths to the names of the predicates that depend
+    on them, so a variable change invalidates only those predicates.
+
+        deps = DependencyIndex()
+        deps.add(pred.name, ("hosts", "h1", "available"))
+        deps.dependents(("hosts", "h1", "available"))  # {pred.name}
+
+    watch() also watches the variable in its VarStore.  When it
+    changes, the predicates that depend on it are forgotten and passed
+    to on_change; they watch() again when they're rechecked.  A path
+    nobody depends on any more is unwatched.
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self.readers = {} # map from var path -> set of pred names
+        self.watched = {} # map from pred name -> set of var paths
+        self.store_watches = {} # map from var path -> (VarPath, VarWatch)
+
+    def add(self, name, path):
+        """name depends on path.  Returns True if path is new to the index"""
+        self.watched.setdefault(name, set()).add(path)
+        names = self.readers.get(path)
+        if names is None:
+            self.readers[path] = set([name])
+            return True
+        names.add(name)
+        return False
+
+    def watch(self, name, var):
+        """name depends on var, a VarPath.  Watch it for changes"""
+        self.add(name, var.path)
+        if var.path not in self.store_watches:
+            val, watch = var.watch(self._changed)
+            self.store_watches[var.path] = (var, watch)
+
+    def discard(self, name):
+        """forget everything name depends on"""
+        for path in self.watched.pop(name, ()):
+            names = self.readers[path]
+            names.discard(name)
+            if not names:
+                del self.readers[path]
+                var_watch = self.store_watches.pop(path, None)
+                if var_watch is not None:
+                    var, watch = var_watch
+                    var.unwatch(watch)
+
+    def invalidate(self, paths):
+        """forget and return the names that depend on any of paths"""
+        names = self.invalidated(paths)
+        for name in names:
+            self.discard(name)
+        return names
+
+    def _changed(self, path):
+        names = self.invalidate([path])
+        if names and self.on_change is not None:
+            self.on_change(names)
+
+    def dependents(self, path):
+        """return the set of names that depend on path"""
+        return set(self.readers.get(path, ()))
+
+    def invalidated(self, paths):
+        """return the set of names that depend on any of paths"""
+        names = set()
+        for path in paths:
+            names.update(self.readers.get(path, ()))
+        return names
+
+    def paths(self, name):
+        return set(self.watched.get(name, ()))
+
+    def __contains__(self, path):
+        return path in self.readers
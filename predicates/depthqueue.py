@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+
+
+class DepthQueue(object):
+    """A set of predicate names bucketed by depth.
+
+    add() and discard() are O(1).  deepest() returns the bucket at the
+    maximum depth itself, without sorting or copying.  Names keep
+    insertion order within a bucket, except that discard() moves the
+    bucket's last name into the gap.  Either way the order only
+    depends on the adds and discards made, so a solver replaying its
+    choices sees the same order.
+
+        q = DepthQueue()
+        q.add("a", 1)
+        q.add("b", 2)
+        q.deepest()  # ["b"]
+    """
+
+    def __init__(self):
+        self.buckets = {} # map from depth -> list of names
+        self.depths = {} # map from name -> depth
+        self.index = {} # map from name -> index in its bucket
+        self.max_depth = None
+
+    def add(self, name, depth):
+        """add name at depth, or move it there if already queued"""
+        old = self.depths.get(name)
+        if old is not None:
+            if old == depth:
+                return
+            self._remove(name, old)
+        self.depths[name] = depth
+        bucket = self.buckets.get(depth)
+        if bucket is None:
+            bucket = self.buckets[depth] = []
+        self.index[name] = len(bucket)
+        bucket.append(name)
+        if self.max_depth is None or depth > self.max_depth:
+            self.max_depth = depth
+
+    def discard(self, name):
+        depth = self.depths.pop(name, None)
+        if depth is not None:
+            self._remove(name, depth)
+
+    def deepest(self):
+        """return the list of names at the maximum depth.  The list is
+        mine, so don't change it, and it changes with me"""
+        if self.max_depth is None:
+            return []
+        return self.buckets[self.max_depth]
+
+    def _remove(self, name, depth):
+        bucket = self.buckets[depth]
+        i = self.index.pop(name)
+        last = bucket.pop()
+        if last != name:
+            # fill the gap with the last name
+            bucket[i] = last
+            self.index[last] = i
+        if not bucket:
+            del self.buckets[depth]
+            if depth == self.max_depth:
+                # there are only as many buckets as distinct depths
+                self.max_depth = max(self.buckets) if self.buckets else None
+
+    def __contains__(self, name):
+        return name in self.depths
+
+    def __len__(self):
+        return len(self.depths)
+
+    def __iter__(self):
+        return iter(self.depths)
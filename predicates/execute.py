@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+import collections
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class Executor(object):
+    """Runs predicate actions in dependency order on a pool of threads.
+
+    A predicate runs once all of its children have finished, so
+    independent predicates, like VMs on different hosts, run in
+    parallel.  At most per_host actions run on one host at a time.
+    If an action fails, every predicate that depends on it, directly
+    or not, is skipped.
+
+        executor = Executor(workers=8, per_host=2)
+        states = executor.run(children, start, host=host_of)
+        failed = [name for name, state in states.items()
+                  if state == Executor.FAILED]
+    """
+
+    DONE = 'done'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+    def __init__(self, workers=4, per_host=1):
+        self.workers = workers
+        self.per_host = per_host
+        self.errors = {} # map from name -> exception raised by action
+
+    def run(self, children, action, host=None):
+        """children maps every name to run to the names it depends on.
+        Children that aren't in children are taken as already done.
+        action(name) does the work.  host(name) returns the host name
+        runs on, or None for no per-host limit.
+
+        Returns a map from name to DONE, FAILED or SKIPPED"""
+        self.errors = {}
+        states = {}
+        pending = {} # map from name -> number of unfinished children
+        parents = collections.defaultdict(list)
+        ready = collections.deque()
+        for name, deps in children.items():
+            deps = [dep for dep in deps if dep in children]
+            pending[name] = len(deps)
+            for dep in deps:
+                parents[dep].append(name)
+            if not deps:
+                ready.append(name)
+
+        tasks = queue.Queue()
+        done = queue.Queue()
+        threads = []
+        for i in range(min(self.workers, len(children))):
+            t = threading.Thread(target=self._work, args=(tasks, done, action))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+
+        running = 0
+        host_running = collections.defaultdict(int)
+        hosts = {}
+        try:
+            while len(states) < len(children):
+                # start everything ready that the limits allow
+                deferred = []
+                while ready and running < self.workers:
+                    name = ready.popleft()
+                    h = hosts[name] = host(name) if host else None
+                    if h is not None and host_running[h] >= self.per_host:
+                        deferred.append(name)
+                        continue
+                    host_running[h] += 1
+                    running += 1
+                    tasks.put(name)
+                ready.extendleft(reversed(deferred))
+
+                if not running:
+                    raise ValueError("dependency cycle among: %s" % sorted(
+                        set(children) - set(states)))
+
+                name, error = done.get()
+                running -= 1
+                host_running[hosts[name]] -= 1
+                if error is None:
+                    states[name] = self.DONE
+                    for parent in parents[name]:
+                        pending[parent] -= 1
+                        if not pending[parent] and parent not in states:
+                            ready.append(parent)
+                else:
+                    states[name] = self.FAILED
+                    self.errors[name] = error
+                    self._skip(name, parents, states)
+        finally:
+            for t in threads:
+                tasks.put(None)
+        return states
+
+    def _skip(self, name, parents, states):
+        """skip everything that depends on name"""
+        stack = list(parents[name])
+        while stack:
+            parent = stack.pop()
+            if parent not in states:
+                states[parent] = self.SKIPPED
+                stack.extend(parents[parent])
+
+    @staticmethod
+    def _work(tasks, done, action):
+        while True:
+            name = tasks.get()
+            if name is None:
+                return
+            try:
+                action(name)
+            except Exception as e:
+                done.put((name, e))
+            else:
+                done.put((name, None))
@@ -0,0 +1,140 @@
+#! /usr/bin/env python
+import threading
+import time
+import traceback
+
+
+class Ingester(object):
+    """Buffers monitoring updates and writes them to a VarStore in
+    batches.
+
+    Updates to the same path within a window collapse to the last
+    value.  Each batch is written with VarStore.put_many(), so a watch
+    fires at most once per window, and then on_batch(paths) is called
+    once, e.g. to re-plan.
+
+    A batch is flushed by the first put() after the window has passed,
+    or a window after its first update by a timer, so the last update
+    in a burst isn't held back.  With timer=False there's no timer;
+    call start() to flush every window from a background thread
+    instead, or flush() yourself.
+
+    A bad update doesn't hold up the rest.  If the store raises on an
+    update, it is dropped and on_error(path, val, exception) is called,
+    or the traceback printed if there's no on_error, and the updates
+    after it are written.  This relies on the store writing items in
+    order as it reads them, as VarStore.put_many() does, so the update
+    last read is the one it failed on and those before it were written.
+
+        ingester = Ingester(store, window=1.0, on_batch=replan)
+        ingester.put(("hosts", "h1", "available"), False)
+        ...
+        ingester.stop()
+    """
+
+    def __init__(self, store, window=1.0, on_batch=None, clock=time.time,
+                 timer=True, on_error=None):
+        self.store = store
+        self.window = window
+        self.on_batch = on_batch
+        self.on_error = on_error
+        self.clock = clock
+        self.timer = timer
+        self._timer = None
+        self.pending = {} # map from path -> latest value
+        self.since = None # when the oldest pending update arrived
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock() # keeps batches in order
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def put(self, path, val):
+        with self.lock:
+            if self.since is None:
+                self._begin()
+            self.pending[path] = val
+            due = self.clock() - self.since >= self.window
+        if due:
+            self.flush()
+
+    def put_many(self, items):
+        if hasattr(items, "items"):
+            items = items.items()
+        with self.lock:
+            if self.since is None:
+                self._begin()
+            self.pending.update(items)
+            due = self.clock() - self.since >= self.window
+        if due:
+            self.flush()
+
+    def _begin(self):
+        """start a window.  Call with self.lock held"""
+        self.since = self.clock()
+        if self.timer and self.thread is None and self._timer is None:
+            self._timer = threading.Timer(self.window, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """write all pending updates now.  Returns the paths written"""
+        with self.flush_lock:
+            with self.lock:
+                pending = self.pending
+                self.pending = {}
+                self.since = None
+                timer, self._timer = self._timer, None
+            if timer is not None:
+                timer.cancel()
+            written = self._write(list(pending.items())) if pending else []
+            if written and self.on_batch:
+                self.on_batch(written)
+            return written
+
+    def _write(self, items):
+        """put_many() items, dropping each one the store raises on.
+        Returns the paths written"""
+        written = []
+        while items:
+            read = [0]
+            def reader():
+                for item in items:
+                    read[0] += 1
+                    yield item
+            try:
+                self.store.put_many(reader())
+                written.extend(path for path, val in items)
+                break
+            except Exception as e:
+                # the store stopped at the item it last read
+                bad = max(read[0], 1)
+                written.extend(path for path, val in items[:bad - 1])
+                path, val = items[bad - 1]
+                if self.on_error:
+                    self.on_error(path, val, e)
+                else:
+                    traceback.print_exc()
+                items = items[bad:]
+        return written
+
+    def start(self):
+        """flush every window in a background thread"""
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """stop the background thread or timer and flush what's left"""
+        if self.thread:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def _run(self):
+        while not self.stopping.wait(self.window):
+            self.flush()
+
+    def __len__(self):
+        return len(self.pending)
@@ -0,0 +1,122 @@
+#! /usr/bin/env python
+import array
+
+from predicates.capacity import RESOURCES
+
+
+class Ledger(object):
+    """Free host resources and the reservations made against them.
+
+    Free amounts are kept in one array per resource, indexed by a slot
+    number per host, so reserve() and release() are O(1) per resource
+    in the ledger itself.  Every change is journaled.  mark() returns
+    a point in the journal and rollback(mark) undoes everything since,
+    so a solver branch can take back all its reservations at once.
+
+        ledger = Ledger(index=capacity_index)
+        ledger.add("h1", cpu=8, ram=64)
+        mark = ledger.mark()
+        if not ledger.reserve("h1", cpu=2, ram=16):
+            ...  # h1 doesn't have room
+        ledger.rollback(mark)
+
+    If index, a capacity.CapacityIndex, is given, it is kept in step
+    with the ledger lazily.  reserve(), release() and rollback() only
+    mark the hosts they change, and the index is brought up to date
+    by sync(), which it calls itself before it's read.  So however
+    many times a branch reserves and rolls back, each host it changed
+    costs one CapacityIndex.set(), which is O(hosts), per read of the
+    index, and none if the index isn't read at all.
+    """
+
+    def __init__(self, resources=RESOURCES, index=None):
+        self.resources = tuple(resources)
+        self.index = index
+        self.free = [array.array("d") for r in self.resources]
+        self.slots = {} # map from host name -> slot
+        self.names = [] # map from slot -> host name, None if removed
+        self.journal = [] # (slot, amounts taken) per reservation
+        self.dirty = set() # slots changed since the index was synced
+        if index is not None:
+            index.on_read = self.sync
+
+    def add(self, name, tags=(), **capacity):
+        assert name not in self.slots, "host %s already in ledger" % (name,)
+        amounts = self._amounts(capacity)
+        self.slots[name] = len(self.names)
+        self.names.append(name)
+        for free, amount in zip(self.free, amounts):
+            free.append(amount)
+        if self.index is not None:
+            self.index.add(name, tags, **dict(zip(self.resources, amounts)))
+
+    def remove(self, name):
+        """stop offering host name.  Its slot isn't reused, so journal
+        entries for it stay valid"""
+        slot = self.slots.pop(name)
+        self.names[slot] = None
+        self.dirty.discard(slot)
+        if self.index is not None and name in self.index:
+            self.index.remove(name)
+
+    def get(self, name, resource):
+        return self.free[self.resources.index(resource)][self.slots[name]]
+
+    def reserve(self, name, **amounts):
+        """take amounts from host name, all or none.  Returns False,
+        taking nothing, if any resource is short"""
+        slot = self.slots[name]
+        amounts = self._amounts(amounts)
+        for free, amount in zip(self.free, amounts):
+            if free[slot] < amount:
+                return False
+        self._apply(slot, amounts, -1)
+        self.journal.append((slot, amounts))
+        return True
+
+    def release(self, name, **amounts):
+        """give amounts back to host name"""
+        slot = self.slots[name]
+        amounts = self._amounts(amounts)
+        self._apply(slot, amounts, 1)
+        self.journal.append((slot, [-amount for amount in amounts]))
+
+    def mark(self):
+        return len(self.journal)
+
+    def rollback(self, mark):
+        """undo every reserve() and release() since mark"""
+        journal = self.journal
+        while len(journal) > mark:
+            slot, amounts = journal.pop()
+            self._apply(slot, amounts, 1)
+
+    def sync(self):
+        """bring the index up to date with every host changed since
+        the last sync"""
+        if not self.dirty or self.index is None:
+            return
+        dirty, self.dirty = self.dirty, set()
+        for slot in dirty:
+            name = self.names[slot]
+            if name is not None:
+                self.index.set(name, **dict((r, free[slot]) for r, free
+                                            in zip(self.resources, self.free)))
+
+    def commit(self):
+        """forget the journal.  Earlier marks can't be rolled back to"""
+        del self.journal[:]
+
+    def _amounts(self, amounts):
+        ret = [amounts.pop(r, 0) for r in self.resources]
+        assert not amounts, "unknown resources: %s" % sorted(amounts)
+        return ret
+
+    def _apply(self, slot, amounts, sign):
+        for free, amount in zip(self.free, amounts):
+            if amount:
+                free[slot] += sign * amount
+        self.dirty.add(slot)
+
+    def __contains__(self, name):
+        return name in self.slots
@@ -0,0 +1,89 @@
+#! /usr/bin/env python
+
+
+class Vars(dict):
+    """Copy-on-write variables.  A clone holds only the names set
+    since it was cloned and looks everything else up in its parent.
+
+    Each clone() adds a level to the parent chain.  Once the chain is
+    FLATTEN_DEPTH deep, clone() starts the new Vars from a flattened
+    copy of the chain instead, so a lookup walks at most FLATTEN_DEPTH
+    levels however deep the solver branches.  A Vars must not change
+    after it has been cloned.
+
+    Variables are read and set as attributes.  The chain is kept in
+    slots, so only names starting with "_", and dict's own methods,
+    can't be used as variables.
+
+        v = Vars()
+        v.a = 1
+        c = v.clone()
+        del c.a
+        c.a  # AttributeError
+        v.a  # 1
+    """
+    __slots__ = ("_parent", "_depth", "_flat")
+
+    class DELETED(object): pass
+
+    FLATTEN_DEPTH = 32
+
+    def __init__(self, parent=None):
+        super(Vars, self).__init__()
+        # slots are set with object.__setattr__, since __setattr__ sets variables
+        object.__setattr__(self, "_parent", parent)
+        object.__setattr__(self, "_depth", 0 if parent is None else parent._depth + 1)
+        object.__setattr__(self, "_flat", None)
+
+    def clone(self):
+        if self._depth >= self.FLATTEN_DEPTH:
+            return Vars(self.flatten())
+        return Vars(self)
+
+    def flatten(self):
+        """return a parentless Vars with the same variables as me"""
+        if self._parent is None:
+            return self
+        if self._flat is None:
+            chain = []
+            v = self
+            while v is not None:
+                chain.append(v)
+                v = v._parent
+            flat = Vars()
+            for v in reversed(chain):
+                dict.update(flat, v)
+            for name in [name for name, value in flat.items()
+                         if value is Vars.DELETED]:
+                del flat[name]
+            object.__setattr__(self, "_flat", flat)
+        return self._flat
+
+    def __reduce__(self):
+        # copy and pickle would otherwise set my slots as variables
+        return (Vars, (self._parent,), None, None, iter(dict.items(self)))
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            # reserved, like my slots before they're set, or a dunder
+            # that copy or pickle looks for
+            raise AttributeError(name)
+        v = self
+        while v is not None:
+            if name in v:
+                value = v[name]
+                if value is Vars.DELETED:
+                    raise AttributeError(name)
+                return value
+            v = v._parent
+        raise AttributeError(name)
+
+    def __setitem__(self, name, value):
+        object.__setattr__(self, "_flat", None)
+        super(Vars, self).__setitem__(name, value)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        self[name] = Vars.DELETED
@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+
+
+class Overlay(object):
+    """A map that reads through to a base map and keeps its own
+    writes and deletes, so making one is O(1) however big base is.
+
+    Env.clone() gives each solver branch an Overlay of the live Env's
+    predicates, and Env.adopt() commits the chosen branch's changes
+    back into the base.
+
+        preds = Overlay(live)
+        preds[name] = pred   # live doesn't change
+        preds.commit()       # now it does
+    """
+
+    class DELETED(object): pass
+
+    def __init__(self, base):
+        self.base = base
+        self.local = {} # my writes, DELETED for my deletes
+
+    def __getitem__(self, key):
+        value = self.local.get(key, self.DELETED)
+        if value is self.DELETED:
+            if key in self.local:
+                raise KeyError(key)
+            return self.base[key]
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        self.local[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.local[key] = self.DELETED
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def __contains__(self, key):
+        if key in self.local:
+            return self.local[key] is not self.DELETED
+        return key in self.base
+
+    def __iter__(self):
+        local = self.local
+        for key in self.base:
+            if key not in local:
+                yield key
+        for key, value in local.items():
+            if value is not self.DELETED:
+                yield key
+
+    def __len__(self):
+        n = len(self.base)
+        for key, value in self.local.items():
+            if key in self.base:
+                if value is self.DELETED:
+                    n -= 1
+            elif value is not self.DELETED:
+                n += 1
+        return n
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def commit(self):
+        """write my changes into base, and return the keys written.
+        Deleted keys aren't returned"""
+        base = self.base
+        written = []
+        for key, value in self.local.items():
+            if value is self.DELETED:
+                base.pop(key, None)
+            else:
+                base[key] = value
+                written.append(key)
+        self.local = {}
+        return written
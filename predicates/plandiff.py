@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+from predicates.execute import Executor
+
+
+class PlanDiff(object):
+    """The changes that take one plan to another.
+
+    start: names of predicates only in the new plan, children first
+    stop: names of predicates only in the old plan, parents first
+    reconfigure: names in both plans whose result, host, or children
+        changed, children first
+    vars: names of variables that were added, removed, or changed
+    """
+
+    def __init__(self, start=(), stop=(), reconfigure=(), vars=()):
+        self.start = list(start)
+        self.stop = list(stop)
+        self.reconfigure = list(reconfigure)
+        self.vars = list(vars)
+
+    def __len__(self):
+        return len(self.start) + len(self.stop) + len(self.reconfigure)
+
+    def __repr__(self):
+        return "PlanDiff(start=%r, stop=%r, reconfigure=%r, vars=%r)" % (
+            self.start, self.stop, self.reconfigure, self.vars)
+
+
+def changed(old_pred, new_pred):
+    """return True if new_pred must be reconfigured to replace old_pred"""
+    return old_pred.ret != new_pred.ret \
+        or old_pred.host != new_pred.host \
+        or set(old_pred.children) != set(new_pred.children)
+
+
+def diff(old_preds, new_preds, old_vars=None, new_vars=None):
+    """compare two plans, maps from pred.name -> predicate, and return
+    the PlanDiff between them.  Predicates are matched by name, which
+    includes their arguments.  Names are ordered by depth; names at the
+    same depth keep the order of their plan."""
+    start = []
+    reconfigure = []
+    for name, pred in new_preds.items():
+        old = old_preds.get(name)
+        if old is None:
+            start.append(name)
+        elif changed(old, pred):
+            reconfigure.append(name)
+    stop = [name for name in old_preds if name not in new_preds]
+
+    start.sort(key=lambda name: -new_preds[name].depth)
+    reconfigure.sort(key=lambda name: -new_preds[name].depth)
+    stop.sort(key=lambda name: old_preds[name].depth)
+
+    var_names = []
+    if old_vars is not None or new_vars is not None:
+        old_vars = old_vars or {}
+        new_vars = new_vars or {}
+        var_names = [name for name in new_vars
+                     if name not in old_vars or old_vars[name] != new_vars[name]]
+        var_names.extend(name for name in old_vars if name not in new_vars)
+
+    return PlanDiff(start, stop, reconfigure, var_names)
+
+
+def apply(old_preds, new_preds=None, executor=None):
+    """start the predicates in old_preds, children first, running
+    independent predicates in parallel and at most executor.per_host
+    at once on each pred.host.
+
+    If new_preds is given, move from old_preds to new_preds instead:
+    stop only the predicates new dropped, and start or reconfigure
+    only the ones new added or changed.  A dropped predicate stops
+    after every parent that used it has stopped or been reconfigured
+    off it, so nothing is torn down under a running dependent.
+
+    Returns a map from pred.name -> Executor.DONE, FAILED or SKIPPED"""
+    if executor is None:
+        executor = Executor()
+    if new_preds is None:
+        return executor.run(
+            dict((name, pred.children) for name, pred in old_preds.items()),
+            lambda name: old_preds[name].start(),
+            host=lambda name: old_preds[name].host)
+
+    changes = diff(old_preds, new_preds)
+    stopping = set(changes.stop)
+    starting = set(changes.start)
+
+    # one DAG, since stop, start and reconfigure names don't overlap.
+    # A predicate stops after its old parents, which are stopping or
+    # being reconfigured, and starts after its new children
+    deps = dict((name, old_preds[name].parents) for name in changes.stop)
+    for name in changes.start + changes.reconfigure:
+        deps[name] = new_preds[name].children
+
+    def action(name):
+        if name in stopping:
+            old_preds[name].stop()
+        elif name in starting:
+            new_preds[name].start()
+        else:
+            new_preds[name].reconfigure(old_preds[name])
+
+    def host(name):
+        return (old_preds if name in stopping else new_preds)[name].host
+
+    return executor.run(deps, action, host=host)
@@ -86,6 +86,15 @@ predicate is evaluated in the current system context.
 import collections
 import copy
 
+from predicates.capacity import CapacityIndex
+from predicates.depindex import DependencyIndex
+from predicates.depthqueue import DepthQueue
+from predicates.ledger import Ledger
+from predicates.localvars import Vars
+from predicates.overlay import Overlay
+from predicates import plandiff
+from predicates import snapshot
+
 
 def pred_name(name, *args, **kwargs):
     return (name, args, tuple(sorted(kwargs.items())))
@@ -107,6 +116,7 @@ class Predicate(object):
         self.failed = False
         self.solved = False
         self.ret = None
+        self.host = None # the host my action runs on, if any
 
     def check(self, name, ):
         """Initialize myself from self.env.vars, assuming self.check() already passed"""
@@ -116,13 +126,29 @@ class Predicate(object):
         """undo any changes check() made to self.vars"""
         raise UnimplementedError()
 
+    def start(self):
+        """Carry out my part of the plan, like starting a service.
+        Env.apply() calls this after all my children have started"""
+        pass
+
+    def stop(self):
+        """Undo start().  Env.apply() calls this after all my parents
+        have stopped"""
+        pass
+
+    def reconfigure(self, old):
+        """Replace old, the same predicate from the previous plan, with
+        myself"""
+        old.stop()
+        self.start()
+
     def vars(self):
         """return the dict of system variables"""
         return self.env.vars
 
     def watch(self, var):
         """Recheck myself if var changes"""
-        pass
+        self.env.var_depends(self, var)
 
     def require(self):
         """self.require.pred_name(pred_args)
@@ -142,14 +168,27 @@ class Predicate(object):
 
     def require_pred(self, pred)
         """I require pred, which means pred must be deeper than me"""
+        pred = self.env.own(pred)
         self.children.add(pred.name);
         pred.depth = max(self.depth+1, pred.depth)
         pred.parents.add(self.name)
+        if pred.name in self.env.unsolved:
+            # move pred to its new depth bucket
+            self.env.unsolved.add(pred.name, pred.depth)
 
     def parent_remove(self, pred):
         """Remove pred from self.parents"""
         self.parents.remove(pred.name)
 
+    def clone(self, env):
+        """copy myself into env, sharing nothing mutable"""
+        pred = copy.copy(self)
+        pred.env = env
+        pred.aliases = set(self.aliases)
+        pred.children = set(self.children)
+        pred.parents = set(self.parents)
+        return pred
+
     def unsolved(self):
         self.failed = False
         self.solved = False
@@ -189,16 +228,140 @@ class Env(object):
         self.vars = {}
         self.predicates = {} # map from pred.name -> predicate
 
-        self.unsolved = set() # set of pred.name
-        self.unsolved_sorted = True
+        self.unsolved = DepthQueue() # pred.names bucketed by depth
         self.pred_stack = [] # stack[-1] is the current predicate
 
+        # map from var path -> names of predicates that watch it.
+        # Shared with clones, so a var change always invalidates the
+        # predicates of the env the clones were made from, the live
+        # one, never a clone left over from solving
+        self.deps = DependencyIndex(on_change=self.invalidate)
+
+        # free capacity of available hosts, indexed for the host
+        # predicate.  The ledger keeps it up to date as the reserve
+        # predicate takes resources and solve() rolls them back
+        self.capacity = CapacityIndex()
+        self.ledger = Ledger(index=self.capacity)
+        # the order the host predicate tries hosts in.  See
+        # capacity.ORDERINGS
+        self.placement = "best_fit"
+        # offer the solver at most this many hosts per placement, or
+        # every host that fits if None
+        self.host_choices = None
+
     def clone(self):
-        """clone a copy of myself for solving"""
-        return self.__class__(self)
+        """clone a copy of myself for solving.  The clone shares my
+        solved predicates and copies them only when it changes them
+        (see own()), so solving again only rechecks the predicates
+        that were invalidated since the last solve.  Its predicates
+        are an Overlay of mine, so cloning doesn't copy the fleet"""
+        env = self.__class__(self)
+        env.pred_funcs = self.pred_funcs
+        env.vars = self.vars
+        env.predicates = Overlay(self.predicates)
+        env.deps = self.deps
+        env.capacity = self.capacity
+        env.ledger = self.ledger
+        env.placement = self.placement
+        env.host_choices = self.host_choices
+        for depth, names in self.unsolved.buckets.items():
+            for name in names:
+                env.unsolved.add(name, depth)
+        return env
+
+    def own(self, pred):
+        """copy-on-write: return my own copy of pred, which may be
+        shared with the env I was cloned from"""
+        if pred.env is not self:
+            pred = pred.clone(self)
+            self.predicates[pred.name] = pred
+        return pred
+
+    def var_depends(self, pred, var):
+        """pred depends on var.  Recheck it when var changes"""
+        self.deps.watch(pred.name, var)
+
+    def adopt(self, plan):
+        """make plan, an Env from my solve(), my plan.  The predicates
+        plan added or changed become mine, so var changes invalidate
+        them here, and its reservations are committed to the ledger.
+        Costs O(predicates plan changed), not O(fleet)"""
+        assert plan.predicates.base is self.predicates, "plan wasn't solved from me"
+        for name in plan.predicates.commit():
+            self.predicates[name].env = self
+        self.unsolved = plan.unsolved
+        self.ledger.commit()
+        # plan shares deps with me.  Changes go to me, the live Env
+        self.deps.on_change = self.invalidate
+
+    def invalidate(self, names):
+        """recheck only the named predicates.  deps calls this when a
+        var they depend on changes"""
+        for name in names:
+            pred = self.predicates.get(name)
+            if pred is not None:
+                self.unsolved_add(pred)
 
     def choose(self, choices):
-        return self.solver.choose(choices)
+        # count the choice against my caller, not this line
+        return self.solver.choose(choices, stacklevel=2)
+
+    def dump(self, fp):
+        """write my predicates and vars to fp as a binary snapshot.
+        See predicates/snapshot.py"""
+        snapshot.dump(self.predicates, self.vars, fp)
+
+    @classmethod
+    def load(cls, fp, parent=None):
+        """return a new Env with the predicates and vars from a
+        snapshot written by dump()"""
+        snap = snapshot.load(fp)
+        env = cls(parent)
+        env.vars = Vars()
+        env.vars.update(snap.vars or {})
+        names = snap.names
+        for i, name in enumerate(names):
+            func_name, args, kwargs = name
+            pred = Predicate(env, *args, **dict(kwargs))
+            pred.name = name
+            pred.func_name = func_name
+            pred.depth = snap.depths[i]
+            pred.solved = snap.solved(i)
+            pred.failed = snap.failed(i)
+            pred.ret = snap.rets[i]
+            pred.children = set(names[child] for child in snap.children(i))
+            env.predicates[name] = pred
+        for i, parents in enumerate(snap.parents()):
+            env.predicates[names[i]].parents = set(names[parent] for parent in parents)
+        return env
+
+    def diff(self, new):
+        """return the plandiff.PlanDiff from my plan to new's"""
+        return plandiff.diff(self.predicates, new.predicates, self.vars, new.vars)
+
+    def apply(self, new=None, executor=None):
+        """start my predicates, children first, running independent
+        predicates in parallel.
+
+        If new is given, move from my plan to new's instead: stop only
+        the predicates new dropped, then start or reconfigure only the
+        ones new added or changed.  See plandiff.apply()
+
+        Returns a map from pred.name -> Executor.DONE, FAILED or SKIPPED"""
+        return plandiff.apply(self.predicates,
+                              None if new is None else new.predicates,
+                              executor)
+
+    def hosts_add(self, name, tags=(), **capacity):
+        """add an available host with capacity like cpu=4, ram=16"""
+        self.vars.hosts.put(name, dict(capacity, tags=tuple(tags), available=True))
+        self.ledger.add(name, tags, **capacity)
+
+    def host_remove(self, name):
+        """mark a host unavailable"""
+        self.vars.hosts[name].available.put(False)
+        if name in self.ledger:
+            self.ledger.remove(name)
 
     def prune(self):
         self.solver.prune()
@@ -240,34 +403,35 @@ class Env(object):
         return lambda(*args, **kwargs): self.predicate_instantiate(name, args, kwargs)
 
     def unsolved_add(self, pred):
+        pred = self.own(pred)
         pred.unsolved()
-        self.unsolved.add(pred.name)
-        self.unsolved_sorted = False
+        self.unsolved.add(pred.name, pred.depth)
 
     def unsolved_choose(self):
-        # choose among all of the predicates at max depth
-        if not self.unsolved_sorted:
-            self.unsolved = sorted(self.unsolved, key=lambda pred_name: self.predicates[pred_name].depth)
-            self.unsolved_sorted = True
-
-        preds = []
-        depth = None
-        while self.unsolved:
-            pred_name = self.unsolved.pop()
-            pred = self.predicates[pred_name]
-            if depth is None:
-                depth = pred.depth
-            if pred.depth != depth:
-                self.unsolved.append(pred.name)
-                break
-            preds.append(pred)
-        return self.solver.choose(preds)
+        # choose among all of the predicates at max depth.  deepest()
+        # isn't a copy, so discard only after choosing
+        pred_name = self.solver.choose(self.unsolved.deepest())
+        self.unsolved.discard(pred_name)
+        return self.own(self.predicates[pred_name])
 
     def solve(self):
+        """yield an Env for each plan found.  adopt() the one to keep.
+
+        The ledger is shared with every branch, so each branch starts
+        by rolling back what the one before it reserved, and a branch
+        that prunes rolls back its own.  While a plan is yielded, the
+        ledger holds exactly its reservations"""
+        base = self.ledger.mark()
+
         def solve_fn(solver):
+            self.ledger.rollback(base)
             env = self.clone()
             env.solver = solver
-            env._solve_me()
+            try:
+                env._solve_me()
+            except Exception:
+                self.ledger.rollback(base)
+                raise
             return env
 
         for env in solver.solve(solve_fn):
@@ -285,33 +449,6 @@ class Env(object):
 
 GlobalEnv = Env()
 
-class Vars(dict):
-    class DELETED(object): pass
-
-    def __init__(self, parent=None):
-        super(Vars, self).__init__()
-        self.parent = parent
-
-    def clone(self):
-        return Vars(self)
-
-    def __getattr__(self, name):
-        if name in self:
-            value = self[name]
-            if value is DELETED:
-                raise AttributeError(name)
-            return value
-        elif self.parent:
-            return getattr(self.parent, name)
-        else:
-            raise AttributeError(name)
-
-    def __setattr__(self, name, value):
-        self[name] = value
-
-    def __delattr__(self, name):
-        self[name] = DELETED
-
 def predicate(fn):
     return GlobalEnv.predicate_func(fn)
 
@@ -325,39 +462,28 @@ def host(self, name, tags=None, ram=0, cpu=0, disk=0):
         host = self.vars.hosts[self.locals.host.get()]
         if not host_available(host, tags):
             self.prune()
+        self.host = host.name()
     else:
-        hosts = []
-        for host in self.vars.hosts.children():
-            if host_available(host, tags) \
-               and host.cpu.get() >= cpu \
-               and host.ram.get() >= ram \
-               and host.disk.get() >= disk \
-               hosts.append(host)
-        host = self.choose(hosts)
-        self.locals.host = host.name
-        self.require.reserve(self.name, host.ram, ram)
-        self.require.reserve(self.name, host.cpu, cpu)
-        self.require.reserve(self.name, host.disk, disk)
+        hosts = self.env.capacity.candidates(tags, order=self.env.placement,
+                                             limit=self.env.host_choices,
+                                             cpu=cpu, ram=ram, disk=disk)
+        host = self.vars.hosts[self.choose(hosts)]
+        self.locals.host = host.name()
+        self.host = host.name()
+        self.require.reserve(self.name, host.name(), cpu=cpu, ram=ram, disk=disk)
         self.watch(host.available)
         self.watch(host.tags)
     return host.name
 
 
 @predicate
-def reserve(self, name, var, amount):
-    if var.get() < self.amount:
+def reserve(self, name, host, **amounts):
+    """take amounts, like cpu=2, ram=4, from host, all or none.
+    Env.solve() rolls the ledger back if the branch prunes"""
+    self.host = host
+    if not self.env.ledger.reserve(host, **amounts):
         self.prune()
 
-    var.put(var.get() - amount)
-    self.locals.amount = amount
-    self.locals.var_path = var.path
-
-    def cleanup(self):
-        if self.locals.amount.exists():
-            var = self.vars[self.locals.var_path.get()]
-            var.put(var.get() + self.locals.amount.get())
-    self.cleanup(cleanup)
-
 
 @predicate
 def qcluster(self, name, build, net, nodes):
@@ -426,7 +552,7 @@ def host_service(self, host, cmd):
 #-----------
 # example
 
-self.hosts_add(100, ram=128, disks=(1000, 1000))
+self.hosts_add(100, ram=128, cpu=32, disk=2000)
 
 self.qcluster("noel's cluster", 1, 100)
 for env2 in self.solve():
@@ -0,0 +1,286 @@
+#! /usr/bin/env python
+"""
+Compact binary snapshots of a predicate graph.
+
+A snapshot is a header followed by tagged sections:
+
+    header   "PSNP", format version (uint16), section count (uint32)
+    section  tag (4 bytes), length (uint32), data
+
+    FUNC  json list of predicate function names, each stored once
+    ARGS  json list of [args, kwargs] per predicate
+    FIDX  int32 per predicate: its index into FUNC
+    DPTH  int32 per predicate: depth
+    FLAG  uint8 per predicate: SOLVED | FAILED
+    COFF  int32 per predicate + 1: offsets into CHLD
+    CHLD  int32 per edge: predicate indexes of children
+    RETS  json list of pred.ret per predicate
+    VARS  json vars
+
+All integers are little endian.  Parents aren't stored; they're the
+inverse of the children.  Loading leaves the integer sections as views
+on the buffer and decodes the json sections when they're first used.
+
+In RETS and VARS a tuple is stored as {"__tuple__": [items]}, so it
+loads as a tuple and not a list.  A dict whose only key is "__tuple__"
+or "__dict__" is stored as {"__dict__": [[key, value]]}, so it can't
+load as something else.
+
+Loading checks the sections fit together, e.g. that every child index
+is a predicate, and raises SnapshotError if they don't.
+"""
+
+import array
+import json
+import struct
+import sys
+
+MAGIC = b"PSNP"
+VERSION = 1
+
+SOLVED = 1
+FAILED = 2
+
+_HEADER = struct.Struct("<4sHI")
+_SECTION = struct.Struct("<4sI")
+_TAGS = (b"FUNC", b"ARGS", b"FIDX", b"DPTH", b"FLAG", b"COFF", b"CHLD",
+         b"RETS", b"VARS")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def dumps(predicates, vars=None):
+    """return a snapshot of predicates, a map from pred.name ->
+    predicate, and vars.  pred.ret and vars must be json-serializable,
+    apart from tuples"""
+    names = list(predicates)
+    index = dict((name, i) for i, name in enumerate(names))
+
+    funcs = []
+    func_index = {}
+    fidx = array.array("i")
+    depths = array.array("i")
+    flags = array.array("B")
+    offsets = array.array("i", [0])
+    children = array.array("i")
+    args = []
+    rets = []
+    for name in names:
+        pred = predicates[name]
+        func, pred_args, pred_kwargs = name
+        i = func_index.get(func)
+        if i is None:
+            i = func_index[func] = len(funcs)
+            funcs.append(func)
+        fidx.append(i)
+        args.append([pred_args, pred_kwargs])
+        depths.append(pred.depth)
+        flags.append((SOLVED if pred.solved else 0) | (FAILED if pred.failed else 0))
+        children.extend(index[child] for child in pred.children)
+        offsets.append(len(children))
+        rets.append(pred.ret)
+
+    sections = [
+        (b"FUNC", _json(funcs)),
+        (b"ARGS", _json(args)),
+        (b"FIDX", _bytes(fidx)),
+        (b"DPTH", _bytes(depths)),
+        (b"FLAG", _bytes(flags)),
+        (b"COFF", _bytes(offsets)),
+        (b"CHLD", _bytes(children)),
+        (b"RETS", _json(_encode(rets))),
+        (b"VARS", _json(_encode(vars))),
+        ]
+    out = [_HEADER.pack(MAGIC, VERSION, len(sections))]
+    for tag, data in sections:
+        out.append(_SECTION.pack(tag, len(data)))
+        out.append(data)
+    return b"".join(out)
+
+
+def dump(predicates, vars, fp):
+    fp.write(dumps(predicates, vars))
+
+
+def loads(buf):
+    return Snapshot(buf)
+
+
+def load(fp):
+    return Snapshot(fp.read())
+
+
+class Snapshot(object):
+    """A loaded snapshot.  names[i] is the name of predicate i, and
+    depths, flags, fidx, offsets and edges are integer sequences
+    indexed the same way"""
+
+    def __init__(self, buf):
+        buf = memoryview(buf)
+        if len(buf) < _HEADER.size:
+            raise SnapshotError("truncated snapshot")
+        magic, version, count = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise SnapshotError("not a snapshot")
+        if version != VERSION:
+            raise SnapshotError("unsupported snapshot version %d" % version)
+
+        sections = {}
+        pos = _HEADER.size
+        for i in range(count):
+            if pos + _SECTION.size > len(buf):
+                raise SnapshotError("truncated snapshot")
+            tag, length = _SECTION.unpack_from(buf, pos)
+            pos += _SECTION.size
+            if pos + length > len(buf):
+                raise SnapshotError("truncated snapshot")
+            sections[tag] = buf[pos:pos + length]
+            pos += length
+        for tag in _TAGS:
+            if tag not in sections:
+                raise SnapshotError("missing section %s" % tag.decode("ascii"))
+
+        self.fidx = _ints(sections, b"FIDX", "i")
+        self.depths = _ints(sections, b"DPTH", "i")
+        self.flags = _ints(sections, b"FLAG", "B")
+        self.offsets = _ints(sections, b"COFF", "i")
+        self.edges = _ints(sections, b"CHLD", "i")
+        n = len(self.depths)
+        for tag, ints, length in ((b"FIDX", self.fidx, n), (b"FLAG", self.flags, n),
+                                  (b"COFF", self.offsets, n + 1)):
+            if len(ints) != length:
+                raise SnapshotError("section %s has %d items for %d predicates" %
+                                    (tag.decode("ascii"), len(ints), n))
+        offsets = self.offsets
+        if offsets[0] != 0 or offsets[n] != len(self.edges) or \
+           any(offsets[i] > offsets[i + 1] for i in range(n)):
+            raise SnapshotError("bad offsets into section CHLD")
+        if len(self.edges) and (min(self.edges) < 0 or max(self.edges) >= n):
+            raise SnapshotError("child index out of range")
+        self._sections = sections
+        self._names = None
+        self._rets = None
+        self._vars = None
+
+    def __len__(self):
+        return len(self.depths)
+
+    @property
+    def names(self):
+        if self._names is None:
+            funcs = _unjson(self._sections, b"FUNC")
+            args = _unjson(self._sections, b"ARGS")
+            if len(args) != len(self):
+                raise SnapshotError("section ARGS has %d items for %d predicates" %
+                                    (len(args), len(self)))
+            if len(self) and (min(self.fidx) < 0 or max(self.fidx) >= len(funcs)):
+                raise SnapshotError("function index out of range")
+            self._names = [(funcs[f], _tuples(a), _tuples(kwargs))
+                           for f, (a, kwargs) in zip(self.fidx.tolist(), args)]
+        return self._names
+
+    def children(self, i):
+        """return the indexes of predicate i's children"""
+        return self.edges[self.offsets[i]:self.offsets[i + 1]]
+
+    def parents(self):
+        """return a list of parent indexes per predicate"""
+        parents = [[] for i in range(len(self))]
+        for i in range(len(self)):
+            for child in self.children(i):
+                parents[child].append(i)
+        return parents
+
+    def solved(self, i):
+        return bool(self.flags[i] & SOLVED)
+
+    def failed(self, i):
+        return bool(self.flags[i] & FAILED)
+
+    @property
+    def rets(self):
+        if self._rets is None:
+            rets = _unjson(self._sections, b"RETS", _decode)
+            if len(rets) != len(self):
+                raise SnapshotError("section RETS has %d items for %d predicates" %
+                                    (len(rets), len(self)))
+            self._rets = rets
+        return self._rets
+
+    @property
+    def vars(self):
+        if self._vars is None:
+            self._vars = _unjson(self._sections, b"VARS", _decode)
+        return self._vars
+
+
+def _json(obj):
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _unjson(sections, tag, object_hook=None):
+    try:
+        return json.loads(bytes(sections[tag]).decode("utf-8"), object_hook=object_hook)
+    except ValueError as e:
+        raise SnapshotError("bad section %s: %s" % (tag.decode("ascii"), e))
+
+
+_ESCAPED = ("__tuple__", "__dict__")
+
+
+def _encode(obj):
+    """tag tuples, which json would otherwise turn into lists, and
+    escape dicts that would look like a tag"""
+    if isinstance(obj, tuple):
+        return {"__tuple__": [_encode(x) for x in obj]}
+    if isinstance(obj, list):
+        return [_encode(x) for x in obj]
+    if isinstance(obj, dict):
+        if len(obj) == 1 and next(iter(obj)) in _ESCAPED:
+            # pairs, since the decoder would see a nested dict as a tag
+            return {"__dict__": [[k, _encode(v)] for k, v in obj.items()]}
+        return dict((k, _encode(v)) for k, v in obj.items())
+    return obj
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        if "__tuple__" in obj:
+            return tuple(obj["__tuple__"])
+        if "__dict__" in obj:
+            return dict(obj["__dict__"])
+    return obj
+
+
+def _tuples(obj):
+    """json turns tuples into lists.  Turn them back, since names must
+    be hashable"""
+    if isinstance(obj, list):
+        return tuple([_tuples(x) if isinstance(x, list) else x for x in obj])
+    return obj
+
+
+def _bytes(arr):
+    if sys.byteorder == "big":
+        arr = array.array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _ints(sections, tag, typecode):
+    """view a section as little endian integers, without copying if I
+    can"""
+    buf = sections[tag]
+    size = struct.calcsize("<" + typecode)
+    if len(buf) % size:
+        raise SnapshotError("section %s is %d bytes, not a multiple of %d" %
+                            (tag.decode("ascii"), len(buf), size))
+    if sys.byteorder == "little" and array.array(typecode).itemsize == size:
+        return buf.cast(typecode)
+    arr = array.array(typecode)
+    arr.frombytes(bytes(buf))
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
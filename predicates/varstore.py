@@ -1,17 +1,35 @@
 #! /usr/bin/env python
+import threading
+import traceback
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 ABSENT = object()
 
 
 class VarStore(object):
-    def __init__(self):
+    def __init__(self, dispatcher=None):
+        """dispatcher runs watch callbacks.  If None, they run inline
+        in put().  See ThreadedDispatcher.
+
+        Changes are made under a lock, so threads, including watches
+        on dispatcher threads, can write at once.  Watches fire after
+        the lock is released."""
         self.root = {}
         self.watches = {}
+        self.dispatcher = dispatcher
+        self.lock = threading.RLock()
+        self._top = VarPath(self)
 
     def top(self):
-        return VarPath(self)
+        return self._top
 
-    def _traverse(self, path, mkdirs=False):
+    def _traverse(self, path, mkdirs=False, changed=None):
+        """find the directory holding path.  With mkdirs, make missing
+        directories, adding each parent that changed to changed"""
         if not path:
             return self.root, None
 
@@ -23,7 +41,7 @@ class VarStore(object):
             if k not in d:
                 if mkdirs:
                     d[k] = {}
-                    self._check_watch(curpath)
+                    changed.append(curpath)
             elif not isinstance(d[k], dict):
                 raise KeyError()
             d = d[k]
@@ -31,22 +49,32 @@ class VarStore(object):
         return d, last
 
     def clear(self, path):
-        d, k = self._traverse(path)
-        if k in d:
-            del d[k]
+        with self.lock:
+            d, k = self._traverse(path)
+            if k in d:
+                del d[k]
+                self._top._uncache(path)
 
     def rm(self, path):
-        d, k = self._traverse(path)
-        del d[k]
+        with self.lock:
+            d, k = self._traverse(path)
+            del d[k]
+            self._top._uncache(path)
         self._check_watch(path)
 
     def mkdir(self, path):
-        d, k = self._traverse(path, True)
-        if k not in d:
-            d[k] = {}
-            self._check_watch(path)
-        elif not isinstance(d[k], dict):
-            raise KeyError("path %s already exists as %s" % (path, d[k]))
+        changed = []
+        try:
+            with self.lock:
+                d, k = self._traverse(path, True, changed)
+                if k not in d:
+                    d[k] = {}
+                    changed.append(path)
+                elif not isinstance(d[k], dict):
+                    raise KeyError("path %s already exists as %s" % (path, d[k]))
+        finally:
+            for p in changed:
+                self._check_watch(p)
 
     def ls(self, path):
         if not path:
@@ -61,24 +89,195 @@ class VarStore(object):
         return d[k]
 
     def put(self, path, val):
-        d, k = self._traverse(path, mkdirs=True)
-        d[k] = val
-        self._check_watch(path)
+        changed = []
+        try:
+            with self.lock:
+                d, k = self._traverse(path, True, changed)
+                d[k] = val
+                changed.append(path)
+        finally:
+            for p in changed:
+                self._check_watch(p)
+
+    def put_many(self, items):
+        """put every (path, val) in items, a dict or an iterable of
+        pairs.  Directories are traversed once per batch, not once
+        per key, and each affected watch fires once at the end"""
+        if hasattr(items, "items"):
+            items = items.items()
+        dirs = {(): self.root}
+        changed = set()
+        try:
+            with self.lock:
+                for path, val in items:
+                    assert path, "empty path in put_many"
+                    d = self._dir(path[:-1], dirs, changed)
+                    if path in dirs:
+                        # overwriting a cached directory invalidates the cache
+                        dirs.clear()
+                        dirs[()] = self.root
+                    d[path[-1]] = val
+                    changed.add(path)
+        finally:
+            # a bad path stops the batch, but what was put stays put
+            self._check_watches(changed)
+
+    def load(self, items, path=()):
+        """put_many() with every path relative to path.  Accepts the
+        output of dump()"""
+        self.put_many((path + p, val) for p, val in items)
+
+    def _dir(self, path, dirs, changed):
+        """find or make the directory at path, caching it in dirs"""
+        d = dirs.get(path)
+        if d is None:
+            parent = self._dir(path[:-1], dirs, changed)
+            k = path[-1]
+            assert k, "empty path in %s" % (path,)
+            if k not in parent:
+                parent[k] = {}
+                changed.add(path[:-1])
+            elif not isinstance(parent[k], dict):
+                raise KeyError("path %s already exists as %s" % (path, parent[k]))
+            d = dirs[path] = parent[k]
+        return d
+
+    def walk(self, path=()):
+        """iterate over (path, val) for every leaf under path, depth
+        first.  Empty directories are leaves too, yielded as a new {}
+        so they can be loaded elsewhere.  Only one directory listing
+        per level is held at a time"""
+        val = self.get(path)
+        if not isinstance(val, dict):
+            yield path, val
+            return
+        if not val:
+            if path:
+                yield path, {}
+            return
+        stack = [(path, iter(list(val.items())))]
+        while stack:
+            dirpath, it = stack[-1]
+            for k, val in it:
+                subpath = dirpath + (k,)
+                if isinstance(val, dict):
+                    if val:
+                        stack.append((subpath, iter(list(val.items()))))
+                        break
+                    val = {}
+                yield subpath, val
+            else:
+                stack.pop()
+
+    def dump(self, path=()):
+        """iterate over (relpath, val) for every leaf under path, with
+        relpath relative to path"""
+        n = len(path)
+        for p, val in self.walk(path):
+            yield p[n:], val
 
     def _check_watch(self, path):
-        for watch in self.watches.get(path, []):
-            watch.func(path)
+        dispatcher = self.dispatcher
+        # a watch may unwatch itself
+        for watch in list(self.watches.get(path, ())):
+            if dispatcher is None:
+                watch.func(path)
+            else:
+                dispatcher.dispatch(watch, path)
+
+    def _check_watches(self, paths):
+        for path in list(self.watches):
+            if path in paths:
+                self._check_watch(path)
 
     def watch(self, path, func):
-        val = self.get(path)
-        watch = VarWatch(path, func)
-        if path not in self.watches:
-            self.watches[path] = []
-        self.watches[path].append(watch)
+        with self.lock:
+            val = self.get(path)
+            watch = VarWatch(path, func)
+            if path not in self.watches:
+                self.watches[path] = []
+            self.watches[path].append(watch)
         return (val, watch)
 
     def unwatch(self, watch):
-        self.watches.get(watch.path, {}).remove(watch)
+        with self.lock:
+            self.watches.get(watch.path, {}).remove(watch)
+
+
+class ThreadedDispatcher(object):
+    """Runs watch callbacks on a pool of worker threads so a slow
+    watch doesn't stall writers.
+
+    Each watch is pinned to one worker, so it sees its notifications
+    in the order they were made.  Each worker has at most maxsize
+    notifications from outside writers queued; when it's full, the
+    writer blocks until that worker catches up.
+
+    Watches may write to the store too, like a watch that re-plans.
+    The store's lock keeps those writes from racing outside writers.
+    Notifications made from a worker thread are queued without
+    waiting, since a worker blocking on a full queue, maybe its own,
+    would never catch up.
+
+        store = VarStore(ThreadedDispatcher(workers=4))
+        ...
+        store.dispatcher.flush()  # wait for pending callbacks
+    """
+
+    def __init__(self, workers=4, maxsize=1000, on_error=None):
+        self.on_error = on_error
+        self.local = threading.local()
+        self.queues = [queue.Queue() for i in range(workers)]
+        # room left in each queue for notifications from outside writers
+        self.slots = [threading.Semaphore(maxsize) for i in range(workers)]
+        self.threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._run, args=(i,))
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def dispatch(self, watch, path):
+        i = hash(watch) % len(self.queues)
+        if getattr(self.local, "worker", False):
+            # re-entrant: a watch wrote to the store
+            self.queues[i].put((watch, path, False))
+        else:
+            self.slots[i].acquire()
+            self.queues[i].put((watch, path, True))
+
+    def flush(self):
+        """block until every queued callback has run"""
+        for q in self.queues:
+            q.join()
+
+    def close(self):
+        """run queued callbacks, then stop the workers"""
+        for q in self.queues:
+            q.put(None)
+        for t in self.threads:
+            t.join()
+
+    def _run(self, i):
+        self.local.worker = True
+        q = self.queues[i]
+        while True:
+            item = q.get()
+            try:
+                if item is None:
+                    return
+                watch, path, slot = item
+                if slot:
+                    self.slots[i].release()
+                try:
+                    watch.func(path)
+                except Exception as e:
+                    if self.on_error:
+                        self.on_error(watch, path, e)
+                    else:
+                        traceback.print_exc()
+            finally:
+                q.task_done()
 
 
 class VarWatch(object):
@@ -88,14 +287,24 @@ class VarWatch(object):
 
 
 class VarPath(object):
+    """A handle on a path in a VarStore.  Handles are slotted and
+    cache their children, so hot loops like r.d1.d2.v1.get() only
+    allocate on the first access to each path.  A handle caches at
+    most CHILD_CACHE children; past that its cache starts over.
+    rm() and clear() drop the handles under the removed path."""
+    __slots__ = ("keystore", "path", "_children")
+
+    CHILD_CACHE = 256
+
     def __init__(self, keystore, path=None):
-        vars(self)["keystore"] = keystore
+        object.__setattr__(self, "keystore", keystore)
         if path is None:
             path = ()
         else:
             if not isinstance(path, tuple):
                 path = (path,)
-        vars(self)["path"] = path
+        object.__setattr__(self, "path", path)
+        object.__setattr__(self, "_children", None)
 
     def __getitem__(self, name):
         """allows path["name1"]["name2"]"""
@@ -113,7 +322,27 @@ class VarPath(object):
         return self.child(name).put(val)
 
     def child(self, name):
-        return VarPath(self.keystore, self.path + (name,))
+        children = self._children
+        if children is None:
+            children = {}
+            object.__setattr__(self, "_children", children)
+        child = children.get(name)
+        if child is None:
+            if len(children) >= self.CHILD_CACHE:
+                children.clear()
+            child = children[name] = VarPath(self.keystore, self.path + (name,))
+        return child
+
+    def _uncache(self, path):
+        """drop the cached handle for path, relative to me"""
+        handle = self
+        for k in path[:-1]:
+            children = handle._children
+            handle = children.get(k) if children else None
+            if handle is None:
+                return
+        if handle._children:
+            handle._children.pop(path[-1], None)
 
     def ls(self):
         for name in self.keystore.ls(self.path):
@@ -124,6 +353,27 @@ class VarPath(object):
             return self.keystore.put(self.path, key)
         return self.child(key).put(value)
 
+    def put_many(self, items):
+        """put_many() with keys relative to me.  A key is a name or a
+        tuple of names"""
+        if hasattr(items, "items"):
+            items = items.items()
+        self.keystore.put_many(
+            (self.path + (k if isinstance(k, tuple) else (k,)), val)
+            for k, val in items)
+
+    def load(self, items):
+        return self.keystore.load(items, self.path)
+
+    def walk(self):
+        """iterate over (VarPath, val) for every leaf under me.  The
+        handles aren't cached"""
+        for path, val in self.keystore.walk(self.path):
+            yield VarPath(self.keystore, path), val
+
+    def dump(self):
+        return self.keystore.dump(self.path)
+
     def get(self, name=ABSENT, default=None):
         if name is not ABSENT:
             try:
@@ -1,6 +1,8 @@
 #! /usr/bin/env python
 import collections
 
+from solver.trace import call_site
+
 
 class Solver(object):
     """
@@ -40,37 +42,132 @@ function would require a language change.  (yield isn't sufficient.).
 So, this restarts the function from scratch at every evaluation
     """
 
-    def __init__(self):
-        self.choice_stack = []
+    POOL_SIZE = 16 # idle Search contexts kept for reuse
+
+    def __init__(self, trace=None, order=None):
+        """trace is an optional trace.SearchTrace that records the
+        search tree.  order is an optional adaptive.AdaptiveOrder that
+        reorders choices by how often they have pruned.
+
+        All the state of a search lives in a Search, and every solve()
+        gets its own, so one Solver can run interleaved or concurrent
+        solves.  trace and order are shared by all of them, and keep
+        their per-evaluation state in the Search."""
+        self.trace = trace
+        self.order = order
+        self.pool = [] # idle Search contexts
+
+    def solve(self, fn, *args, **kwargs):
+        """repeatedly call function , iterating over all possible outputs.
+        fn is called as fn(search, *args, **kwargs), where search is a
+        Search with choose(), prune(), if_any() and else_none()"""
+        try:
+            search = self.pool.pop()
+        except IndexError:
+            search = Search(self)
+        search.trace = self.trace
+        search.order = self.order
+        try:
+            for r in search.run(fn, args, kwargs):
+                yield r
+        finally:
+            search.reset()
+            if len(self.pool) < self.POOL_SIZE:
+                self.pool.append(search)
+
+
+class Search(object):
+    """The state of one solve().  Solver.solve() passes this to the
+    function being solved as its solver argument"""
+    __slots__ = ("trace", "order", "choice_stack", "choices",
+                 "choices_idx", "if_any_stack", "path", "evaluation")
+
+    def __init__(self, solver):
+        self.trace = solver.trace
+        self.order = solver.order
+        self.reset()
+
+    def reset(self):
+        self.choice_stack = None
+        self.choices = None
         self.choices_idx = -1
         self.if_any_stack = []
-        self.choices = None
+        self.path = [] # (call site, choice index) of each choose()
+        self.evaluation = None # trace state of the current evaluation, if sampled
 
-    def solve(self, fn, *args, **kwargs):
-        """repeatedly call function , iterating over all possible outputs"""
+    def run(self, fn, args, kwargs):
         self.choice_stack = collections.deque()
         self.choice_stack.append([])
         while len(self.choice_stack) > 0:
             self.choices = self.choice_stack.popleft()
             self.choices_idx = -1
             self.if_any_stack = []
+            self.path = []
+            if self.trace:
+                evaluation = self.trace.begin()
+                # the trace only wants to hear about sampled evaluations
+                self.evaluation = evaluation if evaluation.sampled else None
             try:
-                yield fn(self, *args, **kwargs)
+                ret = fn(self, *args, **kwargs)
             except PruneException:
-                pass
+                if self.evaluation:
+                    self.trace.end(self.evaluation, "prune")
+                if self.order:
+                    self.order.record(self.path, False)
+                continue
             except ChooseException:
                 # could return partial solutions here
-                pass
+                if self.evaluation:
+                    self.trace.end(self.evaluation, "choose")
+                continue
+            if self.evaluation:
+                self.trace.end(self.evaluation, "solution")
+            if self.order:
+                self.order.record(self.path, True)
+            yield ret
+
+    def choose(self, choices, equivalence=None, stacklevel=1):
+        """branch myself to evaluate each choice in choices.
+
+        If equivalence is given, choices with the same
+        equivalence(choice) are interchangeable, and only the first
+        of each is evaluated.
 
-    def choose(self, choices):
-        """branch myself to evaluate each choice in choices"""
+        stacklevel says which caller a trace or an adaptive order
+        counts the choice against, like warnings.warn(): 1 is my
+        caller, and a wrapper around choose() passes 2 so its callers
+        are told apart"""
         self.choices_idx += 1
+        site = call_site(stacklevel - 1) if self.evaluation or self.order else None
         if self.choices_idx < len(self.choices):
             # return the next choice in my path, if there is one
-            return choices[self.choices[self.choices_idx]]
+            if self.evaluation:
+                self.trace.choose(self.evaluation, self.choices_idx,
+                                  len(choices), False, site)
+            i = self.choices[self.choices_idx]
+            if self.order:
+                self.path.append((site, i))
+            return choices[i]
         else:
+            order = range(len(choices))
+            if equivalence is not None:
+                # one representative per equivalence class
+                seen = set()
+                order = []
+                for i, choice in enumerate(choices):
+                    key = equivalence(choice)
+                    if key not in seen:
+                        seen.add(key)
+                        order.append(i)
+            if self.order:
+                order = self.order.order(site, order)
+
+            if self.evaluation:
+                self.trace.choose(self.evaluation, self.choices_idx,
+                                  len(order), True, site)
+
             # push all possible next choices
-            for i in range(1, len(choices)):
+            for i in order[1:]:
                 self.choice_stack.append(self.choices + [i])
 
             # if I'm in under an if_any block, then count the number
@@ -78,15 +175,19 @@ So, this restarts the function from scratch at every evaluation
             # *all* end in prune.
             if self.if_any_stack:
                 if_any_inst = self.if_any_stack[-1]
-                if_any_inst.branch_count += len(choices)-1
+                if_any_inst.branch_count += len(order)-1
 
             # return the first choice
-            choice = choices[0]
-            self.choices.append(0)
-            return choice
+            i = order[0]
+            if self.order:
+                self.path.append((site, i))
+            self.choices.append(i)
+            return choices[i]
 
     def prune(self):
         """abort the current branch"""
+        if self.evaluation:
+            self.trace.prune(self.evaluation)
 
         # if I'm in under an if_any block, then decrement my branch count
         if self.if_any_stack:
@@ -159,3 +260,15 @@ class IfAny(object):
 def solve(fn, *args, **kwargs):
     for r in Solver().solve(fn, *args, **kwargs):
         yield r
+
+
+def canonical(solutions, canonicalize):
+    """yield canonicalize(solution) for each of solutions, skipping
+    solutions whose canonical form was already seen.  Use it to
+    collapse solutions that are symmetric variants of each other"""
+    seen = set()
+    for solution in solutions:
+        solution = canonicalize(solution)
+        if solution not in seen:
+            seen.add(solution)
+            yield solution
@@ -0,0 +1,56 @@
+#! /usr/bin/env python
+import threading
+
+
+class AdaptiveOrder(object):
+    """Learns which choices lead to prune() and tries the promising
+    ones first.
+
+        order = AdaptiveOrder()
+        for i in range(runs):
+            for solution in Solver(order=order).solve(fn):
+                break  # gets here sooner as order learns
+
+    Choices are identified by the file:line that called choose(), or
+    the wrapper around it given by its stacklevel, and their index in
+    the choices passed to it.  Every evaluation that
+    returns counts as a success for each choice on its path, and every
+    evaluation that prunes counts as a prune for each of them.  Sibling
+    choices are then tried in order of their success rate.  With
+    fail_first, the least successful are tried first instead, to find
+    out early that a branch is hopeless.
+
+    Keep one AdaptiveOrder across solves of similar problems, like
+    re-planning the same fleet, to reuse what it learned.  Concurrent
+    solves can share it.
+    """
+
+    def __init__(self, fail_first=False):
+        self.fail_first = fail_first
+        self.stats = {} # map from (site, index) -> [successes, prunes]
+        self.lock = threading.Lock()
+
+    def order(self, site, indexes):
+        """return indexes, the indexes of choices made at site, in the
+        order to try them"""
+        stats = self.stats
+        scores = {}
+        with self.lock:
+            for i in indexes:
+                s = stats.get((site, i))
+                # Laplace smoothing: untried choices score 0.5
+                scores[i] = 0.5 if s is None else (s[0] + 1.0) / (s[0] + s[1] + 2.0)
+        sign = 1 if self.fail_first else -1
+        return sorted(indexes, key=lambda i: sign * scores[i])
+
+    def record(self, path, success):
+        """count an evaluation that made the choices in path, a list of
+        (site, index), and then returned if success, or pruned"""
+        k = 0 if success else 1
+        stats = self.stats
+        with self.lock:
+            for choice in path:
+                s = stats.get(choice)
+                if s is None:
+                    s = stats[choice] = [0, 0]
+                s[k] += 1
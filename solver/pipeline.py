@@ -0,0 +1,187 @@
+#! /usr/bin/env python
+"""
+Streaming helpers for solve() output.
+
+    solutions = solve(diehardn, 4, 3, 5)
+    solutions = dedup(solutions)           # drop repeats
+    solutions = buffered(solutions, 1000)  # search ahead in a thread
+    with open("moves.jsonl", "w") as f:
+        write_jsonl(solutions, f)
+
+Each stage is a generator, so solutions flow through one at a time.
+"""
+
+import hashlib
+import json
+import pickle
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+_INTS = (int, type(2 ** 64)) # long too, on python 2
+_TEXT = type(u"")
+
+
+def canonical(solution):
+    """return solution encoded as bytes, such that equal solutions
+    encode the same.  Lists and tuples encode alike, dicts and sets
+    encode the same whatever order their items are in, and -0.0 encodes
+    as 0.0.
+
+    Supports None, bool, int, float, str, bytes, and lists, tuples,
+    dicts, sets and frozensets of them.  Values of different types are
+    never equal, so 1, 1.0 and True are all different.  Raises
+    TypeError for anything else, such as an object whose equality is
+    its identity, since there's no encoding to compare it by"""
+    out = []
+    _canonical(solution, out)
+    return b"".join(out)
+
+
+def _canonical(obj, out):
+    # every encoding is self-delimiting, so a container's encoding is
+    # just its items' encodings in a row
+    if obj is None:
+        out.append(b"N")
+    elif obj is True:
+        out.append(b"T")
+    elif obj is False:
+        out.append(b"F")
+    elif isinstance(obj, _INTS):
+        out.append(b"i%d;" % obj)
+    elif isinstance(obj, float):
+        out.append(b"f" + repr(obj + 0.0).encode("ascii") + b";") # -0.0 + 0.0 is 0.0
+    elif isinstance(obj, _TEXT):
+        data = obj.encode("utf-8", "surrogatepass")
+        out.append(b"s%d:" % len(data))
+        out.append(data)
+    elif isinstance(obj, bytes):
+        out.append(b"b%d:" % len(obj))
+        out.append(obj)
+    elif isinstance(obj, (list, tuple)):
+        out.append(b"l")
+        for x in obj:
+            _canonical(x, out)
+        out.append(b"e")
+    elif isinstance(obj, dict):
+        out.append(b"d")
+        out.extend(sorted(canonical(k) + canonical(v) for k, v in obj.items()))
+        out.append(b"e")
+    elif isinstance(obj, (set, frozenset)):
+        out.append(b"S")
+        out.extend(sorted(canonical(x) for x in obj))
+        out.append(b"e")
+    else:
+        raise TypeError("can't encode %s for dedup" % type(obj).__name__)
+
+
+def dedup(solutions, key=None):
+    """yield solutions, skipping any whose key(solution), or the
+    solution itself if key is None, was seen before.  Keys are compared
+    by canonical(), so must be of the types it supports.  Only a 16 byte
+    digest of each key's encoding is kept, so memory grows with the
+    number of distinct solutions but not with their size"""
+    seen = set()
+    for solution in solutions:
+        digest = hashlib.md5(canonical(solution if key is None else key(solution))).digest()
+        if digest not in seen:
+            seen.add(digest)
+            yield solution
+
+
+def buffered(solutions, size):
+    """iterate over solutions in a background thread, up to size ahead
+    of the consumer.  When the buffer is full the search waits, so a
+    slow consumer holds at most size solutions in memory.
+
+    If the consumer stops early, the thread closes solutions once the
+    search in progress reaches its next solution, and the consumer
+    doesn't wait for that"""
+    q = queue.Queue(size)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for solution in solutions:
+                if not _put(q, (None, solution), stop):
+                    return
+        except Exception as e:
+            _put(q, (e, None), stop)
+        else:
+            _put(q, (None, done), stop)
+        finally:
+            # close here, since a generator can't be closed while it
+            # runs in another thread.  That returns a solve()'s Search
+            # to its pool
+            close = getattr(solutions, "close", None)
+            if close is not None:
+                close()
+
+    t = threading.Thread(target=produce)
+    t.daemon = True
+    t.start()
+    try:
+        while True:
+            error, solution = q.get()
+            if error is not None:
+                raise error
+            if solution is done:
+                return
+            yield solution
+    finally:
+        # the consumer stopped early.  Tell the producer to exit, but
+        # don't wait for it: it may be deep in a search
+        stop.set()
+
+
+def _put(q, item, stop):
+    """put item on q unless stop is set first"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def write_jsonl(solutions, fp):
+    """write each solution to fp as a line of json.  Returns the count"""
+    n = 0
+    for solution in solutions:
+        fp.write(json.dumps(solution))
+        fp.write("\n")
+        n += 1
+    return n
+
+
+def read_jsonl(fp):
+    for line in fp:
+        yield json.loads(line)
+
+
+def write_binary(solutions, fp):
+    """write each solution to binary file fp as a pickle.  Returns the
+    count"""
+    n = 0
+    pickler = pickle.Pickler(fp, pickle.HIGHEST_PROTOCOL)
+    for solution in solutions:
+        pickler.dump(solution)
+        # don't remember every solution written
+        pickler.clear_memo()
+        n += 1
+    return n
+
+
+def read_binary(fp):
+    unpickler = pickle.Unpickler(fp)
+    while True:
+        try:
+            yield unpickler.load()
+        except EOFError:
+            return
@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+import json
+import sys
+import threading
+import time
+
+
+def call_site(depth=0):
+    """return "file:line" of the caller depth frames above my caller"""
+    frame = sys._getframe(depth + 2)
+    return "%s:%d" % (frame.f_code.co_filename, frame.f_lineno)
+
+
+class SearchTrace(object):
+    """Records where a Solver's search tree branches.
+
+        trace = SearchTrace()
+        for solution in Solver(trace=trace).solve(fn):
+            ...
+        trace.summary()          # per call site counts, busiest first
+        with open("trace.json", "w") as f:
+            trace.chrome(f)      # for chrome://tracing or speedscope
+
+    Every choice point is counted against the file:line that called
+    choose(), or that called a wrapper that passed choose() a
+    stacklevel.  Per call site, the summary has:
+
+        choice_points  new choice points created there
+        branches       extra branches queued there
+        prunes         branches pruned after their last choice was there
+        time           seconds spent running code after choosing there
+
+    Only every sample'th evaluation of the function is traced.  The
+    rest are counted in evaluations but otherwise cost the solver
+    nothing, not even finding the call site, so with sample > 1 the
+    per site counts are of the sampled evaluations alone; multiply by
+    sample to estimate the whole search.  Timeline events are recorded
+    for sampled evaluations up to max_events, so tracing a long search
+    stays bounded.
+
+    Each evaluation keeps its own state in the Evaluation that begin()
+    returns, so concurrent or interleaved solves can share a trace.
+    """
+
+    def __init__(self, sample=1, max_events=100000, clock=time.time):
+        self.sample = sample
+        self.max_events = max_events
+        self.clock = clock
+        self.sites = {} # map from call site -> SiteStats
+        self.events = []
+        self.evaluations = 0
+        self.start = None
+        self.lock = threading.Lock() # guards everything above
+
+    def begin(self):
+        """the solver is starting an evaluation of its function.
+        Returns the Evaluation to pass to my other hooks, which are
+        only called if it's sampled"""
+        now = self.clock()
+        with self.lock:
+            if self.start is None:
+                self.start = now
+            self.evaluations += 1
+            sampled = self.evaluations % self.sample == 0
+            return Evaluation(self.evaluations, now, sampled)
+
+    def choose(self, evaluation, depth, arity, new, site=None):
+        """the solver reached a choice point, new if it wasn't replaying
+        a choice it already made.  site defaults to the file:line that
+        called my caller"""
+        if site is None:
+            site = call_site(1)
+        now = self.clock()
+        with self.lock:
+            self._charge(evaluation, now)
+            evaluation.site = site
+            if not new:
+                return
+            stats = self.sites.get(site)
+            if stats is None:
+                stats = self.sites[site] = SiteStats(site)
+            stats.choice_points += 1
+            stats.branches += arity - 1
+            self._event({"name": site, "ph": "i", "s": "t",
+                         "ts": self._us(now),
+                         "args": {"depth": depth, "arity": arity}})
+
+    def prune(self, evaluation):
+        with self.lock:
+            stats = self.sites.get(evaluation.site)
+            if stats is not None:
+                stats.prunes += 1
+
+    def end(self, evaluation, outcome):
+        """the evaluation ended in outcome, like "solution" or "prune" """
+        now = self.clock()
+        with self.lock:
+            self._charge(evaluation, now)
+            self._event({"name": outcome, "ph": "X",
+                         "ts": self._us(evaluation.start),
+                         "dur": (now - evaluation.start) * 1e6,
+                         "args": {"evaluation": evaluation.number}})
+
+    def summary(self):
+        """return a list of per call site dicts, most branches first"""
+        with self.lock:
+            return [stats.dict() for stats in
+                    sorted(self.sites.values(), key=lambda s: (-s.branches, s.site))]
+
+    def chrome(self, fp):
+        """write the timeline in Chrome trace format, which speedscope
+        also reads, with the summary in its metadata"""
+        summary = self.summary()
+        with self.lock:
+            events = list(self.events)
+            evaluations = self.evaluations
+        json.dump({"traceEvents": events,
+                   "displayTimeUnit": "ms",
+                   "otherData": {"evaluations": evaluations,
+                                 "summary": summary}},
+                  fp)
+
+    def _charge(self, evaluation, now):
+        site = evaluation.site
+        if site is not None and site in self.sites:
+            self.sites[site].time += now - evaluation.mark
+        evaluation.mark = now
+
+    def _event(self, event):
+        if len(self.events) < self.max_events:
+            event["pid"] = 0
+            event["tid"] = 0
+            self.events.append(event)
+
+    def _us(self, t):
+        return (t - self.start) * 1e6
+
+
+class Evaluation(object):
+    """The trace state of one evaluation of a solver's function"""
+    __slots__ = ("number", "start", "sampled", "site", "mark")
+
+    def __init__(self, number, start, sampled):
+        self.number = number
+        self.start = start
+        self.sampled = sampled
+        self.site = None # the last call site
+        self.mark = start # when I last hit a hook
+
+
+class SiteStats(object):
+    __slots__ = ("site", "choice_points", "branches", "prunes", "time")
+
+    def __init__(self, site):
+        self.site = site
+        self.choice_points = 0
+        self.branches = 0
+        self.prunes = 0
+        self.time = 0.0
+
+    def dict(self):
+        return dict((k, getattr(self, k)) for k in self.__slots__)
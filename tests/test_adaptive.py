@@ -0,0 +1,54 @@
+#! /usr/bin/env python
+import unittest
+
+from solver import Solver
+from solver.adaptive import AdaptiveOrder
+
+class TestAdaptiveOrder(unittest.TestCase):
+    def fn(self, solver):
+        self.evaluations += 1
+        x = solver.choose(range(10))
+        if x < 8:
+            solver.prune()
+        return x
+
+    def first(self, order):
+        self.evaluations = 0
+        for x in Solver(order=order).solve(self.fn):
+            return x, self.evaluations
+
+    def test_adaptive(self):
+        order = AdaptiveOrder()
+        self.assertEqual((8, 9), self.first(order))
+        # it learns 8 and 9 don't prune
+        self.assertEqual((8, 1), self.first(order))
+        # all solutions are still found
+        self.assertEqual([8, 9], sorted(Solver(order=order).solve(self.fn)))
+
+        order = AdaptiveOrder(fail_first=True)
+        list(Solver(order=order).solve(self.fn))
+        self.evaluations = 0
+        self.assertEqual([8, 9], list(Solver(order=order).solve(self.fn)))
+        self.assertEqual(10, self.evaluations)
+
+    def test_order(self):
+        order = AdaptiveOrder()
+        self.assertEqual([0, 1, 2], order.order("a:1", range(3)))
+        order.record([("a:1", 2)], True)
+        order.record([("a:1", 0)], False)
+        self.assertEqual([2, 1, 0], order.order("a:1", range(3)))
+        self.assertEqual([0, 1, 2], order.order("b:1", [0, 1, 2]))
+
+    def test_stacklevel(self):
+        def choose(solver, choices):
+            return solver.choose(choices, stacklevel=2)
+        def fn(solver):
+            a = choose(solver, range(2))
+            b = choose(solver, range(2))
+            return a, b
+        order = AdaptiveOrder()
+        list(Solver(order=order).solve(fn))
+        # each call of the wrapper learns separately
+        line = fn.__code__.co_firstlineno
+        self.assertEqual(set([line + 1, line + 2]),
+                         set(int(site.rsplit(":", 1)[1]) for site, i in order.stats))
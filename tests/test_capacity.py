@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+import random
+import unittest
+
+from predicates.capacity import CapacityIndex
+
+class TestCapacityIndex(unittest.TestCase):
+    def test_candidates(self):
+        index = CapacityIndex()
+        index.add("h1", tags=("ssd",), cpu=8, ram=64, disk=1000)
+        index.add("h2", tags=("ssd", "gpu"), cpu=4, ram=128, disk=500)
+        index.add("h3", cpu=16, ram=32, disk=2000)
+
+        self.assertEqual(["h1", "h2", "h3"], sorted(index.candidates()))
+        self.assertEqual(["h1", "h2"], sorted(index.candidates("ssd")))
+        self.assertEqual(["h2"], index.candidates(("ssd", "gpu")))
+        self.assertEqual([], index.candidates("nvme"))
+        self.assertEqual(["h1", "h3"], sorted(index.candidates(cpu=8)))
+        self.assertEqual(["h1"], index.candidates("ssd", cpu=8, ram=64))
+        self.assertEqual([], index.candidates(cpu=8, ram=128))
+
+        index.adjust("h1", cpu=-2, ram=-16)
+        self.assertEqual(6, index.get("h1", "cpu"))
+        self.assertEqual(["h3"], index.candidates(cpu=8))
+        self.assertEqual(["h1", "h2"], sorted(index.candidates("ssd", ram=48)))
+
+        index.remove("h2")
+        self.assertNotIn("h2", index)
+        self.assertEqual([], index.candidates("gpu"))
+        self.assertEqual(["h1"], index.candidates("ssd"))
+
+    def test_orderings(self):
+        index = CapacityIndex()
+        index.add("big", cpu=16, ram=128, disk=1000)
+        index.add("small", cpu=4, ram=16, disk=1000)
+        index.add("lopsided", cpu=16, ram=8, disk=1000)
+        index.add("mid", cpu=8, ram=64, disk=1000)
+
+        self.assertEqual(["small", "mid", "big"],
+                         index.candidates(order="best_fit", cpu=2, ram=16))
+        self.assertEqual(["big", "mid", "small"],
+                         index.candidates(order="spread", cpu=2, ram=16))
+        self.assertEqual(["lopsided", "small", "mid", "big"],
+                         index.candidates(order="fail_first", cpu=2, ram=8))
+        self.assertEqual(["big", "lopsided", "mid", "small"],
+                         index.candidates(order=lambda index, hosts, amounts:
+                                          sorted(hosts, key=lambda h: (-index.get(h, "cpu"), h)),
+                                          cpu=2, ram=8))
+
+    def test_matches_scan(self):
+        rnd = random.Random(1)
+        index = CapacityIndex()
+        hosts = {}
+        for i in range(200):
+            free = dict(cpu=rnd.randint(0, 16), ram=rnd.randint(0, 128),
+                        disk=rnd.randint(0, 1000))
+            tags = set(rnd.sample(["a", "b", "c"], rnd.randint(0, 2)))
+            index.add(i, tags=tags, **free)
+            hosts[i] = (free, tags)
+        for i in range(100):
+            h = rnd.randrange(200)
+            delta = rnd.randint(-4, 4)
+            hosts[h][0]["cpu"] += delta
+            index.adjust(h, cpu=delta)
+
+        for i in range(100):
+            need = dict(cpu=rnd.randint(0, 16), ram=rnd.randint(0, 128),
+                        disk=rnd.randint(0, 1000))
+            tags = set(rnd.sample(["a", "b", "c"], rnd.randint(0, 2)))
+            expected = sorted(
+                h for h, (free, htags) in hosts.items()
+                if tags <= htags and all(free[r] >= need[r] for r in need))
+            self.assertEqual(expected, sorted(index.candidates(tags, **need)))
+
+    def test_limit(self):
+        rnd = random.Random(2)
+        index = CapacityIndex()
+        for i in range(500):
+            index.add(i, tags=rnd.sample(["a", "b"], 1),
+                      cpu=rnd.randint(0, 32), ram=rnd.randint(0, 256))
+        for order in (None, "best_fit", "worst_fit", "fail_first"):
+            full = index.candidates("a", order=order, cpu=8, ram=64)
+            self.assertEqual(full[:5], index.candidates("a", order=order, limit=5,
+                                                       cpu=8, ram=64))
+        # best and worst fit follow the scarcest resource, here ram
+        best = index.candidates(order="best_fit", cpu=2, ram=200)
+        rams = [index.get(h, "ram") for h in best]
+        self.assertEqual(sorted(rams), rams)
+        worst = index.candidates(order="worst_fit", limit=3, cpu=2, ram=200)
+        self.assertEqual(list(reversed(best))[:3], worst)
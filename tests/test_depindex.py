@@ -0,0 +1,56 @@
+#! /usr/bin/env python
+import unittest
+
+from predicates.depindex import DependencyIndex
+from predicates.varstore import VarStore
+
+class TestDependencyIndex(unittest.TestCase):
+    def test_depindex(self):
+        deps = DependencyIndex()
+        self.assertTrue(deps.add("host1", ("hosts", "h1", "available")))
+        self.assertFalse(deps.add("host2", ("hosts", "h1", "available")))
+        deps.add("host2", ("hosts", "h2", "available"))
+        deps.add("reserve", ("hosts", "h2", "ram"))
+
+        self.assertEqual(set(["host1", "host2"]),
+                         deps.dependents(("hosts", "h1", "available")))
+        self.assertEqual(set(), deps.dependents(("hosts", "h3", "available")))
+        self.assertEqual(set(["host2", "reserve"]),
+                         deps.invalidated([("hosts", "h2", "available"),
+                                           ("hosts", "h2", "ram")]))
+
+        deps.discard("host2")
+        self.assertEqual(set(["host1"]),
+                         deps.dependents(("hosts", "h1", "available")))
+        self.assertNotIn(("hosts", "h2", "available"), deps)
+        self.assertEqual(set(), deps.paths("host2"))
+        self.assertEqual(set([("hosts", "h2", "ram")]), deps.paths("reserve"))
+
+    def test_watch(self):
+        store = VarStore()
+        hosts = store.top().hosts
+        hosts.put_many({("h1", "available"): True, ("h1", "ram"): 16,
+                        ("h2", "available"): True})
+        requeued = []
+        deps = DependencyIndex(on_change=requeued.append)
+        deps.watch("host1", hosts.h1.available)
+        deps.watch("reserve1", hosts.h1.ram)
+        deps.watch("host2", hosts.h2.available)
+        deps.watch("host2b", hosts.h2.available)
+
+        # only the dependents of the changed var are requeued
+        hosts.h2.available.put(False)
+        self.assertEqual([set(["host2", "host2b"])], requeued)
+        # they're forgotten until they watch again, and the var with
+        # no dependents left is unwatched
+        self.assertNotIn(("hosts", "h2", "available"), deps)
+        self.assertEqual([], store.watches[("hosts", "h2", "available")])
+        hosts.h2.available.put(True)
+        self.assertEqual(1, len(requeued))
+
+        deps.watch("host2", hosts.h2.available)
+        hosts.put_many({("h1", "ram"): 32, ("h2", "available"): False})
+        self.assertEqual([set(["host2"]), set(["reserve1"])],
+                         sorted(requeued[1:], key=sorted))
+        self.assertEqual(set(["host1"]),
+                         deps.dependents(("hosts", "h1", "available")))
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+import unittest
+
+from predicates.depthqueue import DepthQueue
+
+class TestDepthQueue(unittest.TestCase):
+    def test_depthqueue(self):
+        q = DepthQueue()
+        self.assertFalse(q)
+        self.assertEqual([], q.deepest())
+
+        q.add("a", 1)
+        q.add("b", 3)
+        q.add("c", 3)
+        q.add("d", 2)
+        self.assertEqual(4, len(q))
+        self.assertIn("d", q)
+        self.assertEqual(["b", "c"], q.deepest())
+
+        # re-adding at the same depth keeps order
+        q.add("b", 3)
+        self.assertEqual(["b", "c"], q.deepest())
+
+        q.discard("b")
+        q.discard("c")
+        self.assertEqual(["d"], q.deepest())
+
+        # moving a name changes its bucket
+        q.add("a", 4)
+        self.assertEqual(["a"], q.deepest())
+        q.add("a", 0)
+        self.assertEqual(["d"], q.deepest())
+
+        q.discard("d")
+        q.discard("a")
+        q.discard("x")
+        self.assertFalse(q)
+        self.assertEqual([], q.deepest())
+
+    def test_discard_middle(self):
+        q = DepthQueue()
+        for name in "abcd":
+            q.add(name, 1)
+        bucket = q.deepest()
+        # deepest() hands back the bucket, not a copy
+        self.assertIs(bucket, q.deepest())
+
+        # the last name fills the gap
+        q.discard("b")
+        self.assertEqual(["a", "d", "c"], q.deepest())
+        q.discard("c")
+        q.discard("a")
+        self.assertEqual(["d"], q.deepest())
+        q.add("b", 1)
+        self.assertEqual(["d", "b"], q.deepest())
+        q.add("d", 2)
+        self.assertEqual(["d"], q.deepest())
+        q.discard("d")
+        self.assertEqual(["b"], q.deepest())
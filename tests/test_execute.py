@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+import threading
+import time
+import unittest
+
+from predicates.execute import Executor
+
+class TestExecutor(unittest.TestCase):
+    def test_order(self):
+        children = {
+            "app": ["db", "web"],
+            "db": ["host1"],
+            "web": ["host2", "content"],
+            "host1": [],
+            "host2": [],
+            "content": ["installed"], # not in the plan, already done
+            }
+        lock = threading.Lock()
+        ran = []
+
+        def action(name):
+            with lock:
+                ran.append(name)
+
+        states = Executor(workers=3).run(children, action)
+        self.assertEqual(dict((name, Executor.DONE) for name in children), states)
+        for name, deps in children.items():
+            for dep in deps:
+                if dep in children:
+                    self.assertLess(ran.index(dep), ran.index(name))
+
+    def test_failure(self):
+        children = {"app": ["db", "web"], "db": ["host1"], "web": [], "host1": []}
+
+        def action(name):
+            if name == "host1":
+                raise RuntimeError("host1 is down")
+
+        executor = Executor()
+        states = executor.run(children, action)
+        self.assertEqual({"app": Executor.SKIPPED,
+                          "db": Executor.SKIPPED,
+                          "web": Executor.DONE,
+                          "host1": Executor.FAILED}, states)
+        self.assertIsInstance(executor.errors["host1"], RuntimeError)
+
+    def test_limits(self):
+        children = dict(("vm%d" % i, []) for i in range(8))
+        lock = threading.Lock()
+        running = {"all": 0, "h0": 0, "h1": 0}
+        peak = dict(running)
+
+        def action(name):
+            h = "h%d" % (int(name[2:]) % 2)
+            with lock:
+                for k in ("all", h):
+                    running[k] += 1
+                    peak[k] = max(peak[k], running[k])
+            time.sleep(0.01)
+            with lock:
+                for k in ("all", h):
+                    running[k] -= 1
+
+        states = Executor(workers=4, per_host=1).run(
+            children, action, host=lambda name: "h%d" % (int(name[2:]) % 2))
+        self.assertEqual(set([Executor.DONE]), set(states.values()))
+        self.assertEqual(1, peak["h0"])
+        self.assertEqual(1, peak["h1"])
+        self.assertEqual(2, peak["all"])
+
+    def test_cycle(self):
+        self.assertRaises(ValueError, Executor().run,
+                          {"a": ["b"], "b": ["a"]}, lambda name: None)
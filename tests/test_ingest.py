@@ -0,0 +1,107 @@
+#! /usr/bin/env python
+import threading
+import unittest
+
+from predicates import varstore
+from predicates.ingest import Ingester
+
+class TestIngester(unittest.TestCase):
+    def test_ingest(self):
+        store = varstore.VarStore()
+        r = store.top()
+        r.hosts.h1.available = True
+        r.hosts.h2.available = True
+
+        updates = []
+        r.hosts.h1.available.watch(updates.append)
+        batches = []
+        now = [0.0]
+        ingester = Ingester(store, window=1.0, on_batch=batches.append,
+                            clock=lambda: now[0], timer=False)
+
+        for i in range(100):
+            ingester.put(("hosts", "h1", "available"), i % 2 == 0)
+            now[0] += 0.001
+        ingester.put_many({("hosts", "h2", "cpu"): 5})
+        self.assertEqual(2, len(ingester))
+        self.assertEqual([], updates)
+        self.assertEqual([], batches)
+        self.assertEqual(True, r.hosts.h1.available.get())
+
+        # the window has passed, so the next put flushes
+        now[0] += 1.0
+        ingester.put(("hosts", "h2", "cpu"), 7)
+        self.assertEqual(0, len(ingester))
+        self.assertEqual(False, r.hosts.h1.available.get())
+        self.assertEqual(7, r.hosts.h2.cpu.get())
+        self.assertEqual([("hosts", "h1", "available")], updates)
+        self.assertEqual(1, len(batches))
+        self.assertEqual(set([("hosts", "h1", "available"), ("hosts", "h2", "cpu")]),
+                         set(batches[0]))
+
+        self.assertEqual([], ingester.flush())
+        self.assertEqual(1, len(batches))
+
+    def test_background(self):
+        store = varstore.VarStore()
+        batches = []
+        ingester = Ingester(store, window=0.01, on_batch=batches.append,
+                            timer=False)
+        ingester.start()
+        ingester.put(("a",), 1)
+        ingester.stop()
+        self.assertEqual(1, store.get(("a",)))
+        self.assertEqual([[("a",)]], batches)
+
+    def test_timer(self):
+        store = varstore.VarStore()
+        flushed = threading.Event()
+        ingester = Ingester(store, window=0.01,
+                            on_batch=lambda paths: flushed.set())
+        # the last update of a burst is flushed without another put
+        ingester.put(("a",), 1)
+        self.assertTrue(flushed.wait(5))
+        self.assertEqual(1, store.get(("a",)))
+        self.assertEqual(0, len(ingester))
+        ingester.stop()
+
+    def test_store_error(self):
+        store = varstore.VarStore()
+        store.put(("hosts", "h1"), 5)
+        batches = []
+        errors = []
+        ingester = Ingester(store, on_batch=batches.append, timer=False,
+                            on_error=lambda path, val, e: errors.append((path, val)))
+        ingester.put(("hosts", "h0"), 0)
+        ingester.put(("hosts", "h1", "cpu"), 4)
+        ingester.put(("hosts", "h2"), 1)
+
+        # the bad update is dropped, and those either side written
+        self.assertEqual([("hosts", "h0"), ("hosts", "h2")], ingester.flush())
+        self.assertEqual([(("hosts", "h1", "cpu"), 4)], errors)
+        self.assertEqual([[("hosts", "h0"), ("hosts", "h2")]], batches)
+        self.assertEqual(0, len(ingester))
+        self.assertEqual(0, store.get(("hosts", "h0")))
+        self.assertEqual(1, store.get(("hosts", "h2")))
+
+        # and doesn't hold up the next batch
+        ingester.put(("hosts", "h2"), 2)
+        self.assertEqual([("hosts", "h2")], ingester.flush())
+        self.assertEqual(2, store.get(("hosts", "h2")))
+        self.assertEqual(1, len(errors))
+
+    def test_store_error_timer(self):
+        store = varstore.VarStore()
+        store.put(("h1",), 5)
+        flushed = threading.Event()
+        errors = []
+        ingester = Ingester(store, window=0.01,
+                            on_batch=lambda paths: flushed.set(),
+                            on_error=lambda path, val, e: errors.append(path))
+        ingester.put(("h1", "cpu"), 4)
+        ingester.put(("h2",), 1)
+        self.assertTrue(flushed.wait(5))
+        self.assertEqual([("h1", "cpu")], errors)
+        self.assertEqual(1, store.get(("h2",)))
+        self.assertEqual(0, len(ingester))
+        ingester.stop()
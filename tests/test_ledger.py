@@ -0,0 +1,93 @@
+#! /usr/bin/env python
+import unittest
+
+from predicates.capacity import CapacityIndex
+from predicates.ledger import Ledger
+
+class CountingIndex(CapacityIndex):
+    def __init__(self):
+        CapacityIndex.__init__(self)
+        self.sets = 0
+
+    def set(self, name, **amounts):
+        self.sets += 1
+        CapacityIndex.set(self, name, **amounts)
+
+class TestLedger(unittest.TestCase):
+    def test_ledger(self):
+        index = CapacityIndex()
+        ledger = Ledger(index=index)
+        ledger.add("h1", tags=("ssd",), cpu=8, ram=64, disk=100)
+        ledger.add("h2", cpu=4, ram=16, disk=100)
+
+        mark = ledger.mark()
+        self.assertTrue(ledger.reserve("h1", cpu=6, ram=16))
+        self.assertEqual(2, ledger.get("h1", "cpu"))
+        self.assertEqual(48, ledger.get("h1", "ram"))
+        self.assertEqual(2, index.get("h1", "cpu"))
+        self.assertEqual(["h2"], index.candidates(cpu=4))
+
+        # all or nothing
+        self.assertFalse(ledger.reserve("h1", cpu=1, ram=64))
+        self.assertEqual(2, ledger.get("h1", "cpu"))
+        self.assertEqual(48, ledger.get("h1", "ram"))
+
+        inner = ledger.mark()
+        self.assertTrue(ledger.reserve("h2", cpu=4, disk=50))
+        ledger.release("h1", cpu=1)
+        self.assertEqual(3, ledger.get("h1", "cpu"))
+        self.assertEqual([], index.candidates(cpu=4))
+
+        ledger.rollback(inner)
+        self.assertEqual(2, ledger.get("h1", "cpu"))
+        self.assertEqual(4, ledger.get("h2", "cpu"))
+        self.assertEqual(100, index.get("h2", "disk"))
+
+        ledger.rollback(mark)
+        self.assertEqual(8, ledger.get("h1", "cpu"))
+        self.assertEqual(64, index.get("h1", "ram"))
+        self.assertEqual(["h1", "h2"], sorted(index.candidates(cpu=4)))
+
+        self.assertTrue(ledger.reserve("h1", cpu=8))
+        ledger.commit()
+        ledger.rollback(0)
+        self.assertEqual(0, ledger.get("h1", "cpu"))
+
+        # rollback still works for a removed host
+        mark = ledger.mark()
+        ledger.reserve("h2", cpu=1)
+        ledger.remove("h2")
+        self.assertNotIn("h2", index)
+        ledger.rollback(mark)
+        self.assertNotIn("h2", ledger)
+
+    def test_lazy_index(self):
+        index = CountingIndex()
+        ledger = Ledger(index=index)
+        ledger.add("h1", cpu=100)
+        ledger.add("h2", cpu=100)
+        mark = ledger.mark()
+        for i in range(10):
+            ledger.reserve("h1", cpu=1)
+            ledger.reserve("h2", cpu=2)
+        # nothing is set until the index is read
+        self.assertEqual(0, index.sets)
+        self.assertEqual(80, index.get("h2", "cpu"))
+        # then once per host, not per reservation
+        self.assertEqual(2, index.sets)
+        self.assertEqual(["h1"], index.candidates(cpu=85))
+        self.assertEqual(2, index.sets)
+
+        ledger.rollback(mark)
+        self.assertEqual(2, index.sets)
+        self.assertEqual(["h1", "h2"], sorted(index.candidates(cpu=100)))
+        self.assertEqual(4, index.sets)
+
+        # a branch rolled back before a read never moves the index
+        mark = ledger.mark()
+        ledger.reserve("h1", cpu=5)
+        ledger.release("h2", cpu=5)
+        self.assertEqual(4, index.sets)
+        ledger.rollback(mark)
+        self.assertEqual(100, index.get("h1", "cpu"))
+        self.assertEqual(100, index.get("h2", "cpu"))
@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+import copy
+import pickle
+import unittest
+
+from predicates.localvars import Vars
+
+class TestVars(unittest.TestCase):
+    def test_clone(self):
+        v = Vars()
+        v.a = 1
+        v.b = 2
+        c = v.clone()
+        c.b = 3
+        c.c = 4
+        self.assertEqual((1, 3, 4), (c.a, c.b, c.c))
+        self.assertEqual(2, v.b)
+        self.assertRaises(AttributeError, getattr, v, "c")
+        # a clone only holds what was set since cloning
+        self.assertEqual({"b": 3, "c": 4}, dict(c))
+
+    def test_delete(self):
+        v = Vars()
+        v.a = 1
+        c = v.clone()
+        del c.a
+        self.assertRaises(AttributeError, getattr, c, "a")
+        self.assertEqual(1, v.a)
+        self.assertNotIn("a", c.flatten())
+
+        # deleted stays deleted down the chain, until set again
+        d = c.clone()
+        self.assertRaises(AttributeError, getattr, d, "a")
+        d.a = 5
+        self.assertEqual(5, d.a)
+        self.assertEqual(5, d.flatten()["a"])
+
+    def test_flatten(self):
+        v = Vars()
+        v.a = 1
+        self.assertIs(v, v.flatten())
+        c = v.clone()
+        c.b = 2
+        flat = c.flatten()
+        self.assertEqual({"a": 1, "b": 2}, dict(flat))
+        self.assertIs(flat, c.flatten())
+        # setting a variable drops the cached flat copy
+        c.b = 3
+        self.assertEqual({"a": 1, "b": 3}, dict(c.flatten()))
+
+    def test_depth_bound(self):
+        v = Vars()
+        v.x0 = 0
+        for i in range(1, 200):
+            v = v.clone()
+            setattr(v, "x%d" % i, i)
+            self.assertLessEqual(v._depth, Vars.FLATTEN_DEPTH)
+        self.assertEqual(0, v.x0)
+        self.assertEqual(150, v.x150)
+        self.assertEqual(199, v.x199)
+
+        # a lookup walks no further than FLATTEN_DEPTH levels
+        levels = 0
+        p = v
+        while p is not None:
+            levels += 1
+            p = p._parent
+        self.assertLessEqual(levels, Vars.FLATTEN_DEPTH + 1)
+
+    def test_reserved_names(self):
+        v = Vars()
+        for name in ("depth", "flat", "parent"):
+            setattr(v, name, 5)
+            c = v.clone()
+            self.assertEqual(5, getattr(c, name))
+            setattr(c, name, 6)
+            self.assertEqual(6, getattr(c, name))
+            self.assertEqual(5, getattr(v, name))
+        self.assertEqual(1, v.clone()._depth)
+
+    def test_copy(self):
+        v = Vars()
+        v.a = 1
+        c = v.clone()
+        c.b = 2
+        del c.a
+        for dup in (copy.copy(c), copy.deepcopy(c),
+                    pickle.loads(pickle.dumps(c))):
+            self.assertEqual(2, dup.b)
+            self.assertRaises(AttributeError, getattr, dup, "a")
+            self.assertEqual(1, dup._depth)
+            self.assertEqual(1, dup._parent.a)
+            self.assertEqual({"b": 2}, dict(dup.flatten()))
+            self.assertNotIn("_parent", dup)
+        self.assertIs(v, copy.copy(c)._parent)
+        self.assertRaises(AttributeError, getattr, Vars(), "_x")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+#! /usr/bin/env python
+import unittest
+
+from predicates.overlay import Overlay
+
+class TestOverlay(unittest.TestCase):
+    def test_overlay(self):
+        base = {"a": 1, "b": 2}
+        o = Overlay(base)
+        self.assertEqual(2, len(o))
+        o["b"] = 3
+        o["c"] = 4
+        del o["a"]
+        self.assertEqual({"b": 2, "a": 1}, base)
+        self.assertEqual(3, o["b"])
+        self.assertNotIn("a", o)
+        self.assertRaises(KeyError, lambda: o["a"])
+        self.assertEqual(None, o.get("a"))
+        self.assertEqual([("b", 3), ("c", 4)], sorted(o.items()))
+        self.assertEqual(2, len(o))
+        self.assertRaises(KeyError, o.__delitem__, "a")
+        self.assertEqual(4, o.pop("c"))
+        self.assertEqual(5, o.pop("c", 5))
+
+        # base changes show through where I haven't written
+        base["d"] = 6
+        self.assertEqual(6, o["d"])
+
+        o["a"] = 7
+        self.assertEqual(["a", "b"], sorted(o.commit()))
+        self.assertEqual({"a": 7, "b": 3, "d": 6}, base)
+        self.assertEqual({}, o.local)
+
+    def test_commit_deletes(self):
+        base = {"a": 1}
+        o = Overlay(base)
+        del o["a"]
+        self.assertEqual([], o.commit())
+        self.assertEqual({}, base)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+import io
+import threading
+import time
+import unittest
+
+from solver import Solver, solve
+from solver import pipeline
+
+def pairs(solver):
+    a = solver.choose(range(3))
+    b = solver.choose(range(3))
+    return sorted([a, b])
+
+class TestPipeline(unittest.TestCase):
+    def test_dedup(self):
+        self.assertEqual(9, len(list(solve(pairs))))
+        self.assertEqual([[0, 0], [0, 1], [0, 2], [1, 1], [1, 2], [2, 2]],
+                         sorted(pipeline.dedup(solve(pairs))))
+        self.assertEqual([[0, 0], [1, 1], [2, 2]],
+                         list(pipeline.dedup(solve(pairs), key=lambda s: s[0])))
+        self.assertEqual([{"a": [1]}, {"a": [2]}],
+                         list(pipeline.dedup([{"a": [1]}, {"a": [2]}, {"a": [1]}])))
+        self.assertEqual([[0.0], [1, {"a", 2, None}]],
+                         list(pipeline.dedup([[0.0], [-0.0], [1, {"a", 2, None}],
+                                              (1, {None, 2, "a"})])))
+        self.assertRaises(TypeError, list, pipeline.dedup([object()]))
+
+    def test_canonical(self):
+        c = pipeline.canonical
+        self.assertEqual(c({1: "a", "b": [2.5]}), c({"b": (2.5,), 1: "a"}))
+        self.assertEqual(c(frozenset([b"x", u"x"])), c(set([u"x", b"x"])))
+        for a, b in ((1, 1.0), (1, True), (0, None), ("1", 1), (b"a", u"a"),
+                     ([1, 2], [[1], 2]), (["ab"], ["a", "b"]), ({}, set()),
+                     ({1: 2}, [1, 2])):
+            self.assertNotEqual(c(a), c(b), (a, b))
+
+    def test_buffered(self):
+        self.assertEqual(list(solve(pairs)), list(pipeline.buffered(solve(pairs), 2)))
+
+        # the search waits for a slow consumer
+        produced = []
+        def gen():
+            for i in range(100):
+                produced.append(i)
+                yield i
+        it = pipeline.buffered(gen(), 5)
+        self.assertEqual(0, next(it))
+        threading.Event().wait(0.05)
+        self.assertLessEqual(len(produced), 7)
+        it.close()
+
+        # errors in the search reach the consumer
+        def broken():
+            yield 1
+            raise ValueError("broken")
+        it = pipeline.buffered(broken(), 5)
+        self.assertEqual(1, next(it))
+        self.assertRaises(ValueError, next, it)
+
+    def test_buffered_close(self):
+        started = threading.Event()
+        def slow(solver):
+            x = solver.choose(range(3))
+            if x > 0:
+                # the search is busy when the consumer stops
+                started.set()
+                time.sleep(0.5)
+            return x
+        solver = Solver()
+        it = pipeline.buffered(solver.solve(slow), 1)
+        self.assertEqual(0, next(it))
+        self.assertTrue(started.wait(5))
+        t = time.time()
+        it.close()
+        self.assertLess(time.time() - t, 0.25)
+
+        # the producer closes the search, which returns to the pool
+        for i in range(50):
+            if solver.pool:
+                break
+            time.sleep(0.1)
+        self.assertEqual(1, len(solver.pool))
+
+    def test_sinks(self):
+        f = io.StringIO()
+        self.assertEqual(6, pipeline.write_jsonl(pipeline.dedup(solve(pairs)), f))
+        f.seek(0)
+        self.assertEqual(sorted(pipeline.dedup(solve(pairs))),
+                         sorted(pipeline.read_jsonl(f)))
+
+        f = io.BytesIO()
+        self.assertEqual(9, pipeline.write_binary(solve(pairs), f))
+        f.seek(0)
+        self.assertEqual(list(solve(pairs)), list(pipeline.read_binary(f)))
@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+import collections
+import threading
+import time
+import unittest
+
+from predicates import plandiff
+from predicates.execute import Executor
+
+class Pred(object):
+    def __init__(self, depth, ret=None, host=None, children=()):
+        self.depth = depth
+        self.ret = ret
+        self.host = host
+        self.children = set(children)
+        self.parents = set()
+
+def plan(preds):
+    for name, pred in preds.items():
+        pred.name = name
+        for child in pred.children:
+            preds[child].parents.add(name)
+    return preds
+
+class Recorder(object):
+    """records the actions apply() takes, and how many ran at once
+    on each host"""
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.log = []
+        self.running = collections.Counter()
+        self.most = collections.Counter()
+
+    def attach(self, preds):
+        for name, pred in preds.items():
+            pred.start = self.action("start", pred)
+            pred.stop = self.action("stop", pred)
+            pred.reconfigure = lambda old, pred=pred: \
+                self.action("reconfigure", pred)()
+
+    def action(self, what, pred):
+        def act():
+            with self.lock:
+                self.log.append((what, pred.name))
+                self.running[pred.host] += 1
+                self.most[pred.host] = max(self.most[pred.host],
+                                           self.running[pred.host])
+            time.sleep(self.delay)
+            with self.lock:
+                self.running[pred.host] -= 1
+        return act
+
+class TestPlanDiff(unittest.TestCase):
+    def test_diff(self):
+        old = {
+            "app": Pred(0, children=["db1", "web"]),
+            "db1": Pred(1, ret="h1", host="h1", children=["disk1"]),
+            "disk1": Pred(2, host="h1"),
+            "web": Pred(1, ret="h2", host="h2"),
+            }
+        new = {
+            "app": Pred(0, children=["db3", "web"]),
+            "db3": Pred(1, ret="h3", host="h3", children=["disk3"]),
+            "disk3": Pred(2, host="h3"),
+            "web": Pred(1, ret="h2", host="h2"),
+            }
+
+        d = plandiff.diff(old, new, {"hosts": 3, "net": "a"}, {"hosts": 2, "net": "a"})
+        self.assertEqual(["disk3", "db3"], d.start)
+        self.assertEqual(["db1", "disk1"], d.stop)
+        self.assertEqual(["app"], d.reconfigure)
+        self.assertEqual(["hosts"], d.vars)
+        self.assertEqual(5, len(d))
+
+        d = plandiff.diff(new, new)
+        self.assertEqual(0, len(d))
+        self.assertEqual([], d.vars)
+
+    def test_apply_per_host(self):
+        preds = plan({
+            "app": Pred(0, children=["vm1", "vm2", "vm3"]),
+            "vm1": Pred(1, host="h1"),
+            "vm2": Pred(1, host="h1"),
+            "vm3": Pred(1, host="h2"),
+            })
+        rec = Recorder(delay=0.02)
+        rec.attach(preds)
+        states = plandiff.apply(preds, executor=Executor(workers=4, per_host=1))
+        self.assertEqual(dict((name, Executor.DONE) for name in preds), states)
+        self.assertEqual(1, rec.most["h1"])
+        self.assertEqual(("start", "app"), rec.log[-1])
+
+    def test_apply_host_change(self):
+        old = plan({"app": Pred(0, children=["vm"]), "vm": Pred(1, host="h1")})
+        new = plan({"app": Pred(0, children=["vm"]), "vm": Pred(1, host="h2")})
+        rec = Recorder()
+        rec.attach(old)
+        rec.attach(new)
+        plandiff.apply(old, new)
+        self.assertEqual([("reconfigure", "vm")], rec.log)
+
+    def test_apply_stop_order(self):
+        # app drops db1 and disk1 for db3 and disk3
+        old = plan({
+            "app": Pred(0, children=["db1", "web"]),
+            "db1": Pred(1, ret="h1", host="h1", children=["disk1"]),
+            "disk1": Pred(2, host="h1"),
+            "web": Pred(1, ret="h2", host="h2"),
+            })
+        new = plan({
+            "app": Pred(0, children=["db3", "web"]),
+            "db3": Pred(1, ret="h3", host="h3", children=["disk3"]),
+            "disk3": Pred(2, host="h3"),
+            "web": Pred(1, ret="h2", host="h2"),
+            })
+        rec = Recorder()
+        rec.attach(old)
+        rec.attach(new)
+        states = plandiff.apply(old, new, Executor(workers=4))
+        self.assertEqual(5, len(states))
+        log = rec.log
+        # app moves to db3 before db1 stops, and db1 stops before disk1
+        self.assertLess(log.index(("start", "disk3")), log.index(("start", "db3")))
+        self.assertLess(log.index(("start", "db3")), log.index(("reconfigure", "app")))
+        self.assertLess(log.index(("reconfigure", "app")), log.index(("stop", "db1")))
+        self.assertLess(log.index(("stop", "db1")), log.index(("stop", "disk1")))
@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+import array
+import io
+import unittest
+
+from predicates import snapshot
+
+class Pred(object):
+    def __init__(self, depth, children=(), ret=None, solved=True, failed=False):
+        self.depth = depth
+        self.children = set(children)
+        self.ret = ret
+        self.solved = solved
+        self.failed = failed
+
+class TestSnapshot(unittest.TestCase):
+    def test_roundtrip(self):
+        app = ("qcluster", ("noel", 1), (("nodes", 3),))
+        host = ("host", ("noel-0",), (("cpu", 4), ("ram", 16)))
+        ram = ("reserve", ("noel-0", ("hosts", "h1", "ram"), 16), ())
+        preds = {
+            app: Pred(0, [host], ret=["h1"]),
+            host: Pred(1, [ram], ret="h1"),
+            ram: Pred(2, failed=True, solved=False),
+            }
+        buf = io.BytesIO()
+        snapshot.dump(preds, {"hosts": {"h1": {"ram": 112}}}, buf)
+
+        snap = snapshot.loads(buf.getvalue())
+        self.assertEqual(3, len(snap))
+        self.assertEqual(set(preds), set(snap.names))
+        self.assertEqual({"hosts": {"h1": {"ram": 112}}}, snap.vars)
+        index = dict((name, i) for i, name in enumerate(snap.names))
+        parents = snap.parents()
+        for name, pred in preds.items():
+            i = index[name]
+            self.assertEqual(pred.depth, snap.depths[i])
+            self.assertEqual(pred.solved, snap.solved(i))
+            self.assertEqual(pred.failed, snap.failed(i))
+            self.assertEqual(pred.ret, snap.rets[i])
+            self.assertEqual(pred.children, set(snap.names[j] for j in snap.children(i)))
+        self.assertEqual([index[host]], list(parents[index[ram]]))
+        self.assertEqual([], parents[index[app]])
+
+    def test_errors(self):
+        buf = snapshot.dumps({})
+        self.assertEqual(0, len(snapshot.loads(buf)))
+        self.assertRaises(snapshot.SnapshotError, snapshot.loads, b"nope" + buf[4:])
+        self.assertRaises(snapshot.SnapshotError, snapshot.loads, buf[:-2])
+        self.assertRaises(snapshot.SnapshotError, snapshot.loads,
+                          buf[:4] + b"\x63\x00" + buf[6:])
+
+        # a section header cut short
+        cut = buf.index(b"RETS") + 2
+        self.assertRaises(snapshot.SnapshotError, snapshot.loads, buf[:cut])
+        # a missing section, with the section count to match
+        end = buf.index(b"VARS")
+        count = snapshot._HEADER.unpack_from(buf)[2]
+        short = snapshot._HEADER.pack(snapshot.MAGIC, snapshot.VERSION, count - 1)
+        self.assertRaises(snapshot.SnapshotError, snapshot.loads,
+                          short + buf[snapshot._HEADER.size:end])
+
+    def test_tuples(self):
+        host = ("host", ("noel-0",), ())
+        preds = {host: Pred(0, ret=("h1", 16))}
+        vars = {"hosts": {"h1": {"tags": ("ssd", "10g"), "nics": [("eth0", 10)]}}}
+        snap = snapshot.loads(snapshot.dumps(preds, vars))
+        self.assertEqual([("h1", 16)], snap.rets)
+        self.assertIsInstance(snap.rets[0], tuple)
+        self.assertEqual(vars, snap.vars)
+        self.assertIsInstance(snap.vars["hosts"]["h1"]["nics"][0], tuple)
+
+    def test_bad_sections(self):
+        a = ("a", (), ())
+        b = ("b", (), ())
+        good = snapshot.dumps({a: Pred(0, [b]), b: Pred(1)})
+
+        def patched(tag, data):
+            """good with section tag's data replaced"""
+            pos = good.index(tag)
+            length = snapshot._SECTION.unpack_from(good, pos)[1]
+            start = pos + snapshot._SECTION.size
+            return (good[:pos] + snapshot._SECTION.pack(tag, len(data)) + data +
+                    good[start + length:])
+
+        ints = lambda *xs: snapshot._bytes(array.array("i", xs))
+        for tag, data in ((b"DPTH", b"\x00" * 7),        # not whole int32s
+                          (b"FIDX", ints(0)),            # one short
+                          (b"FLAG", b"\x01\x01\x01"),    # one over
+                          (b"COFF", ints(0, 1)),         # needs n + 1
+                          (b"COFF", ints(0, 2, 1)),      # not increasing
+                          (b"COFF", ints(0, 0, 0)),      # doesn't end at CHLD
+                          (b"CHLD", ints(2)),            # no predicate 2
+                          (b"CHLD", ints(-1))):
+            self.assertRaises(snapshot.SnapshotError, snapshot.loads,
+                              patched(tag, data))
+
+        # the json sections are checked when they're first used
+        for tag, data, attr in ((b"FIDX", ints(0, 2), "names"),
+                                (b"ARGS", b"[[[],[]]]", "names"),
+                                (b"RETS", b"[null]", "rets"),
+                                (b"VARS", b"{", "vars")):
+            snap = snapshot.loads(patched(tag, data))
+            self.assertRaises(snapshot.SnapshotError, getattr, snap, attr)
+
+    def test_tuple_tags(self):
+        # user dicts that look like a tag load as the same dicts
+        vars = {"a": {"__tuple__": [1, 2]}, "b": {"__dict__": [["x", 1]]},
+                "c": {"__tuple__": {"__dict__": (3,)}},
+                "d": {"__tuple__": 1, "e": 2}}
+        snap = snapshot.loads(snapshot.dumps({}, vars))
+        self.assertEqual(vars, snap.vars)
+        self.assertIsInstance(snap.vars["c"]["__tuple__"]["__dict__"], tuple)
@@ -1,6 +1,7 @@
 #! /usr/bin/env python
+import threading
 import unittest
-from solver import solve
+from solver import Solver, solve
 
 class TestSolver(unittest.TestCase):
     def fn(self, solver):
@@ -16,3 +17,34 @@ class TestSolver(unittest.TestCase):
 
     def test_solver(self):
         self.assertEquals([(2, 1, 0), (3, 1, 0), (1, 3, 0), (2, 3, 0), (3, 2, 1), (1, 2, 3)], list(solve(self.fn)))
+
+    def test_reentrant(self):
+        expected = list(solve(self.fn))
+        solver = Solver()
+
+        # interleaved solves on one solver don't share state
+        a = solver.solve(self.fn)
+        b = solver.solve(self.fn)
+        interleaved = ([], [])
+        for i, j in zip(a, b):
+            interleaved[0].append(i)
+            interleaved[1].append(j)
+        self.assertEqual((expected, expected), interleaved)
+        self.assertEqual([], list(b))
+
+        # finished searches are pooled and reused
+        self.assertEqual(2, len(solver.pool))
+        self.assertEqual(expected, list(solver.solve(self.fn)))
+        self.assertEqual(2, len(solver.pool))
+
+        # and concurrent solves from threads
+        results = []
+        def worker():
+            for k in range(20):
+                results.append(list(solver.solve(self.fn)))
+        threads = [threading.Thread(target=worker) for k in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([expected] * 80, results)
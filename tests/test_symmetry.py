@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+import unittest
+
+from solver import solve, canonical
+
+def queens(solver, n, equivalence=None):
+    board = []
+    for row in range(n):
+        # a board's mirror image is a solution too, so only the left
+        # half of the first row needs trying
+        col = solver.choose(range(n), equivalence if row == 0 else None)
+        for prev_row, prev_col in enumerate(board):
+            if prev_col == col or abs(prev_col - col) == row - prev_row:
+                solver.prune()
+        board.append(col)
+    return board
+
+def symmetries(board):
+    """the 8 rotations and reflections of board"""
+    n = len(board)
+    points = [(row, col) for row, col in enumerate(board)]
+    for i in range(4):
+        points = [(col, n - 1 - row) for row, col in points]
+        for pts in (points, [(row, n - 1 - col) for row, col in points]):
+            yield tuple(col for row, col in sorted(pts))
+
+def canonical_board(board):
+    return min(symmetries(board))
+
+class TestSymmetry(unittest.TestCase):
+    def test_equivalence(self):
+        n = 6
+        mirror = lambda col: min(col, n - 1 - col)
+        self.assertEqual(4, len(list(solve(queens, n))))
+        self.assertEqual([[1, 3, 5, 0, 2, 4], [2, 5, 1, 4, 0, 3]],
+                         sorted(solve(queens, n, mirror)))
+
+    def test_canonical(self):
+        self.assertEqual([(1, 3, 5, 0, 2, 4)],
+                         list(canonical(solve(queens, 6), canonical_board)))
+        self.assertEqual(2, len(list(canonical(solve(queens, 5), canonical_board))))
+
+    def test_if_any(self):
+        # pruning every representative enables else_none
+        def fn(solver):
+            if solver.if_any():
+                solver.choose([1, 1, 2, 2], equivalence=lambda x: x)
+                solver.prune()
+            if solver.else_none():
+                return "none"
+        self.assertEqual(["none"], list(solve(fn)))
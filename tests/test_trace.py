@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+import io
+import json
+import threading
+import unittest
+
+from solver import Solver
+from solver.trace import SearchTrace
+
+def queens(solver, n):
+    board = []
+    for row in range(n):
+        col = solver.choose(range(n))
+        for prev_row, prev_col in enumerate(board):
+            if prev_col == col or abs(prev_col - col) == row - prev_row:
+                solver.prune()
+        board.append(col)
+    return board
+
+def choose(solver, choices):
+    return solver.choose(choices, stacklevel=2)
+
+def pair(solver):
+    a = choose(solver, "ab")
+    b = choose(solver, "xyz")
+    return a + b
+
+def line(fn, offset):
+    """the line offset lines into fn, as a call site names it"""
+    return str(fn.__code__.co_firstlineno + offset)
+
+QUEENS = line(queens, 3)
+PAIR_A = line(pair, 1)
+PAIR_B = line(pair, 2)
+
+class TestSearchTrace(unittest.TestCase):
+    def test_trace(self):
+        trace = SearchTrace()
+        solutions = list(Solver(trace=trace).solve(queens, 5))
+        self.assertEqual(10, len(solutions))
+
+        summary = trace.summary()
+        self.assertEqual(1, len(summary))
+        site = summary[0]
+        self.assertTrue(site["site"].endswith("test_trace.py:" + QUEENS), site["site"])
+        self.assertEqual(trace.evaluations, site["branches"] + 1)
+        self.assertEqual(trace.evaluations - len(solutions), site["prunes"])
+
+        f = io.StringIO()
+        trace.chrome(f)
+        data = json.loads(f.getvalue())
+        phases = [e["ph"] for e in data["traceEvents"]]
+        self.assertEqual(trace.evaluations, phases.count("X"))
+        self.assertEqual(site["choice_points"], phases.count("i"))
+        self.assertEqual(summary, data["otherData"]["summary"])
+
+    def test_sampled(self):
+        calls = [0]
+        def clock():
+            calls[0] += 1
+            return 0.0
+        full = SearchTrace(clock=clock)
+        list(Solver(trace=full).solve(queens, 5))
+        full_calls, calls[0] = calls[0], 0
+
+        trace = SearchTrace(sample=10, max_events=5, clock=clock)
+        list(Solver(trace=trace).solve(queens, 5))
+        self.assertEqual(5, len(trace.events))
+        self.assertEqual(full.evaluations, trace.evaluations)
+        # only sampled evaluations are counted, or call any hook but begin()
+        branches = trace.summary()[0]["branches"]
+        self.assertTrue(0 < branches < full.summary()[0]["branches"] / 5, branches)
+        self.assertLess(calls[0], trace.evaluations + full_calls / 5)
+
+    def test_stacklevel(self):
+        trace = SearchTrace()
+        self.assertEqual(6, len(list(Solver(trace=trace).solve(pair))))
+        # each call of the wrapper is its own site
+        sites = dict((s["site"].rsplit(":", 1)[1], s["branches"])
+                     for s in trace.summary())
+        self.assertEqual({PAIR_A: 1, PAIR_B: 4}, sites)
+
+    def test_concurrent(self):
+        single = SearchTrace()
+        list(Solver(trace=single).solve(queens, 6))
+        expected = single.summary()[0]
+
+        # two threads share a solver and its trace
+        trace = SearchTrace()
+        solver = Solver(trace=trace)
+        def run(fn, *args):
+            for i in range(3):
+                list(solver.solve(fn, *args))
+        threads = [threading.Thread(target=run, args=(queens, 6)),
+                   threading.Thread(target=run, args=(pair,))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        sites = dict((s["site"].rsplit(":", 1)[1], s) for s in trace.summary())
+        self.assertEqual(3 * expected["branches"], sites[QUEENS]["branches"])
+        self.assertEqual(3 * expected["prunes"], sites[QUEENS]["prunes"])
+        self.assertEqual(0, sites[PAIR_A]["prunes"] + sites[PAIR_B]["prunes"])
+        self.assertEqual(3 * (single.evaluations + 6), trace.evaluations)
@@ -1,4 +1,5 @@
 #! /usr/bin/env python
+import threading
 import unittest
 
 from predicates import varstore
@@ -63,3 +64,186 @@ class TestVarstore(unittest.TestCase):
         except KeyError as e:
             ex = e
         assert isinstance(ex, KeyError)
+
+    def test_put_many(self):
+        v = varstore.VarStore()
+        r = v.top()
+
+        updates = []
+        watch_updates = lambda path: updates.append(path)
+        r.watch(watch_updates)
+        r.hosts.h1.ram = 0
+        del updates[:]
+        r.hosts.h1.ram.watch(watch_updates)
+
+        v.put_many([(("hosts", "h1", "ram"), 1),
+                    (("hosts", "h1", "ram"), 2),
+                    (("hosts", "h2", "ram"), 3),
+                    (("tags",), "web")])
+        self.assertEqual(2, r.hosts.h1.ram.get())
+        self.assertEqual(3, r.hosts.h2.ram.get())
+        self.assertEqual("web", r.tags.get())
+        # each watch fires once per batch
+        self.assertEqual([("hosts", "h1", "ram")], updates)
+
+        r.hosts.h2.put_many({"cpu": 4, ("disks", "sda"): 100})
+        self.assertEqual(4, r.hosts.h2.cpu.get())
+        self.assertEqual(100, r.hosts.h2.disks.sda.get())
+
+        # can't put under a leaf
+        ex = None
+        try:
+            v.put_many([(("tags", "x"), 1)])
+        except KeyError as e:
+            ex = e
+        assert isinstance(ex, KeyError)
+
+    def test_walk_dump_load(self):
+        v = varstore.VarStore()
+        r = v.top()
+        r.a.b.c = 1
+        r.a.d = 2
+        r.e = 3
+        v.mkdir(("f",))
+
+        self.assertEqual([(("a", "b", "c"), 1), (("a", "d"), 2), (("e",), 3), (("f",), {})],
+                         sorted(v.walk()))
+        self.assertEqual([(("a", "b", "c"), 1), (("a", "d"), 2)],
+                         sorted(v.walk(("a",))))
+        self.assertEqual([(("b", "c"), 1), (("d",), 2)], sorted(r.a.dump()))
+        self.assertEqual([(("e",), 3)], list(v.walk(("e",))))
+
+        r.copy.load(r.a.dump())
+        self.assertEqual(1, r.copy.b.c.get())
+        self.assertEqual(2, r.copy.d.get())
+        self.assertEqual([(("copy", "b", "c"), 1)],
+                         [(p.path, val) for p, val in r.copy.b.walk()])
+
+    def test_handles_cached(self):
+        v = varstore.VarStore()
+        r = v.top()
+        self.assertIs(r, v.top())
+        self.assertIs(r.d1.d2, r.d1.d2)
+        self.assertIs(r.d1.d2.path, r.d1.d2.path)
+        self.assertRaises(AttributeError, object.__getattribute__, r.d1, "__dict__")
+        r.d1.d2 = 1
+        self.assertEqual(1, r.d1.d2.get())
+
+    def test_threaded_dispatch(self):
+        dispatcher = varstore.ThreadedDispatcher(workers=2, maxsize=1)
+        v = varstore.VarStore(dispatcher)
+        r = v.top()
+        r.a = 0
+        r.b = 0
+
+        seen = []
+        r.a.watch(lambda path: seen.append(v.get(path)))
+        b_updates = []
+        r.b.watch(b_updates.append)
+
+        for i in range(50):
+            r.b = i
+        for i in range(3):
+            r.a = i
+            dispatcher.flush()
+        self.assertEqual([0, 1, 2], seen)
+        self.assertEqual([("b",)] * 50, b_updates)
+
+        # a blocked watch applies backpressure to writers
+        release = threading.Event()
+        r.c = 0
+        r.c.watch(lambda path: release.wait())
+        done = threading.Event()
+
+        def writer():
+            for i in range(3):
+                r.c = i
+            done.set()
+
+        t = threading.Thread(target=writer)
+        t.start()
+        self.assertFalse(done.wait(0.1))
+        release.set()
+        t.join()
+        self.assertTrue(done.is_set())
+        dispatcher.close()
+
+    def test_threaded_dispatch_reentrant(self):
+        # a watch that writes to the store doesn't block its own worker
+        dispatcher = varstore.ThreadedDispatcher(workers=1, maxsize=1)
+        v = varstore.VarStore(dispatcher)
+        r = v.top()
+        r.a = 0
+        r.b = 0
+        seen = []
+
+        def replan(path):
+            r.b = r.b.get() + 1
+            r.b = r.b.get() + 1
+
+        r.a.watch(replan)
+        r.b.watch(seen.append)
+        for i in range(5):
+            r.a = i
+        dispatcher.flush()
+        self.assertEqual(10, r.b.get())
+        self.assertEqual([("b",)] * 10, seen)
+        dispatcher.close()
+
+    def test_concurrent_writers(self):
+        # writers racing to make the same directories don't lose leaves
+        v = varstore.VarStore()
+        def write(n):
+            for i in range(200):
+                v.put(("hosts", "h%d" % i, "w%d" % n), i)
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(800, len(list(v.walk())))
+
+    def test_put_many_errors(self):
+        v = varstore.VarStore()
+        r = v.top()
+        r.tags = "web"
+        r.a = 0
+        updates = []
+        r.a.watch(updates.append)
+
+        # puts before a bad path stay put, and their watches fire
+        self.assertRaises(KeyError, v.put_many,
+                          [(("a",), 1), (("tags", "x"), 1), (("b",), 2)])
+        self.assertEqual(1, r.a.get())
+        self.assertEqual([("a",)], updates)
+
+    def test_dump_copies(self):
+        v = varstore.VarStore()
+        self.assertEqual([], list(v.dump()))
+        v.load(v.dump())
+        self.assertEqual({}, v.root)
+
+        r = v.top()
+        v.mkdir(("a", "f"))
+        r.copy.load(r.a.dump())
+        r.a.f.x = 1
+        self.assertEqual({}, r.copy.f.get())
+
+    def test_handle_cache_bounded(self):
+        v = varstore.VarStore()
+        r = v.top()
+        for i in range(varstore.VarPath.CHILD_CACHE * 2):
+            r.hosts.child(i).put(i)
+        self.assertLessEqual(len(r.hosts._children), varstore.VarPath.CHILD_CACHE)
+
+        # walk doesn't cache handles
+        r = varstore.VarStore().top()
+        r.hosts.h1.ram = 1
+        walked = [p for p, val in r.walk()]
+        self.assertEqual([("hosts", "h1", "ram")], [p.path for p in walked])
+        self.assertEqual(["h1"], list(r.hosts._children))
+        self.assertIsNot(walked[0], r.hosts.h1.ram)
+
+        # removed paths drop their handles
+        r.keystore.rm(("hosts", "h1"))
+        self.assertEqual({}, r.hosts._children)